@@ -1,36 +1,181 @@
-from threading import Thread, Event
-import time
+from threading import Thread, Event, Lock
 
 # Prefer improved detector when available
 try:
     from .recognize import detect
     _USING_IMPROVED = True
-except Exception:
-    from .recognize import detect
+except ImportError:
+    from recognize import detect
     _USING_IMPROVED = False
 
-stop_event = Event()
-result_container = []
-thread = None
+try:
+    from .session_events import SessionEvents
+except ImportError:
+    from session_events import SessionEvents
+
+MAX_SESSIONS = 4            # concurrent detector workers per backend process
+STOP_TIMEOUT = 10.0         # seconds stop() waits for a detector to release its camera
+DEFAULT_SESSION = "default"  # id used by the single-session helpers (main.py)
+
+
+class SessionError(RuntimeError):
+    pass
+
+
+class SessionLimitReached(SessionError):
+    pass
+
+
+class DetectorSession:
+    """One detector worker: its camera source, thread, stop signal, results and live events."""
+
+    def __init__(self, session_id, source=0, headless=False, on_frame=None, students=None, recorder=None):
+        self.session_id = session_id
+        self.source = source
+        self.on_frame = on_frame
+        self.stop_event = Event()
+        self.result_container = []
+        self.events = SessionEvents()
+        self.recorder = recorder
+        self._recorder_lock = Lock()
+        self.thread = Thread(
+            target=self._run,
+            kwargs={"source": source, "headless": headless, "on_frame": on_frame, "students": students},
+            name=f"detector-{session_id}",
+            daemon=True
+        )
+
+    def _recognized(self, code, name, confidence, timestamp):
+        self.events.publish("recognized", student_code=code, name=name,
+                            confidence=round(confidence, 2), time=timestamp)
+        with self._recorder_lock:
+            if self.recorder is not None:
+                self.recorder.write(name, timestamp, student_code=code, confidence=confidence)
+
+    def close_recorder(self):
+        """Flush the recorder's pending rows; recognitions after this aren't recorded."""
+        with self._recorder_lock:
+            recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def _run(self, **kwargs):
+        try:
+            detect(self.stop_event, self.result_container, on_recognized=self._recognized, **kwargs)
+        finally:
+            self.close_recorder()  # flush pending rows before stop() returns
+            self.events.close()
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+
+class SessionManager:
+    """
+    Detector workers keyed by AttendanceSession.id, so one backend process can run
+    several classrooms at once. Every session gets its own camera source, stop event
+    and result list; at most max_sessions run concurrently.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = Lock()
+
+    def _reap(self):
+        # forget workers that have ended: stopped, or ended on their own (camera error, 'q' pressed)
+        for session_id, session in list(self._sessions.items()):
+            if not session.is_alive() and session.stop_event.is_set():
+                del self._sessions[session_id]
+
+    def start(self, session_id, source=0, headless=False, on_frame=None, students=None, recorder=None):
+        with self._lock:
+            self._reap()
+            running = {sid: s for sid, s in self._sessions.items() if s.is_alive()}
+
+            if session_id in running:
+                raise SessionError(f"session {session_id} is already running")
+            if any(s.source == source for s in running.values()):
+                raise SessionError(f"camera source {source!r} is already used by another session")
+            if len(running) >= self.max_sessions:
+                raise SessionLimitReached(f"{self.max_sessions} attendance sessions are already running")
+
+            session = DetectorSession(session_id, source=source, headless=headless, on_frame=on_frame,
+                                      students=students, recorder=recorder)
+            self._sessions[session_id] = session
+            session.thread.start()
+
+        print(f"✅ Attendance session {session_id} started (camera {source!r})")
+        return session
+
+    def stop(self, session_id, timeout=STOP_TIMEOUT):
+        """
+        Stop a session's detector and return the student codes it recognized. Returns as
+        soon as the worker has finished (at most timeout seconds); a worker that is still
+        busy after that keeps running to its end, and the codes recognized so far are returned.
+        Either way the session's recorder has stored its rows and records nothing more, so
+        the caller can decide attendance from them.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            # e.g. the backend restarted since the session was opened
+            print(f"[session] no running detector for session {session_id}")
+            return []
+
+        session.stop_event.set()
+        print(f"🛑 Attendance session {session_id} stopping...")
+        session.thread.join(timeout)
+        if session.is_alive():
+            # it stays registered, holding its camera source, until it ends (see _reap)
+            print(f"[session] detector of session {session_id} still running after {timeout}s")
+            session.close_recorder()
+        with self._lock:
+            self._reap()
+        return list(session.result_container)
+
+    def events(self, session_id):
+        """Live SessionEvents of a session started in this process (None if unknown)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        return session.events if session is not None else None
+
+    def frames(self, session_id):
+        """The on_frame hook a session was started with, e.g. a pipeline.FrameBuffer (None if unknown)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        return session.on_frame if session is not None else None
+
+    def active(self):
+        with self._lock:
+            self._reap()
+            return [sid for sid, s in self._sessions.items() if s.is_alive()]
+
+
+manager = SessionManager()
+
+
+def start_session(session_id=DEFAULT_SESSION, source=0, headless=False, on_frame=None, students=None,
+                  recorder=None):
+    """
+    Start a detector worker for a session. headless=True runs without any OpenCV window
+    (required when the backend runs in Docker / without a display); annotated
+    frames can still be collected through on_frame, e.g. a pipeline.FrameBuffer.
+    students limits recognition to these student codes (None = everybody enrolled).
+    recorder (e.g. a log_sink.BatchWriter) gets write(name, timestamp, student_code=...,
+    confidence=...) for every newly recognized student and is closed when the worker ends.
+    """
+    return manager.start(session_id, source=source, headless=headless, on_frame=on_frame, students=students,
+                         recorder=recorder)
 
-def start_session():
-    global thread, result_container
 
-    result_container.clear()
-    stop_event.clear()
+def session_events(session_id):
+    return manager.events(session_id)
 
-    thread = Thread(
-        target=detect,
-        args=(stop_event, result_container),
-        daemon=True
-    )
-    thread.start()
 
-    print("✅ Attendance session started")
+def session_frames(session_id):
+    return manager.frames(session_id)
 
 
-def stop_session():
-    stop_event.set()
-    print("🛑 Attendance session stopping...")
-    time.sleep(2)
-    return result_container
+def stop_session(session_id=DEFAULT_SESSION, timeout=STOP_TIMEOUT):
+    return manager.stop(session_id, timeout=timeout)
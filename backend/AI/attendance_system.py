@@ -1,8 +1,14 @@
+import os
 import time
 import cv2
 import numpy as np
 import json
 
+try:
+    from .lbph_model import load_recognizer
+except ImportError:
+    from lbph_model import load_recognizer
+
 # def detect():
         
 #     # Load model and labels
@@ -43,9 +49,12 @@ import json
 
 
 
-def detect(stop_event, result_container):
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read("./models/face_recognizer.yml")
+def detect(stop_event, result_container, source=0, headless=False, on_frame=None):
+    # headless=True: no imshow / waitKey; annotated frames only go to on_frame(frame) if given
+    annotate = not headless or on_frame is not None
+
+    # binary model when available (fast to open), else the OpenCV .yml
+    recognizer = load_recognizer("./models/face_recognizer.yml")
 
     with open("./models/labels.json") as f:
         labels = json.load(f)
@@ -69,7 +78,7 @@ def detect(stop_event, result_container):
         cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
     )
 
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(source)
     detected_students = set()
 
     while not stop_event.is_set():
@@ -105,12 +114,19 @@ def detect(stop_event, result_container):
                     detected_students.add(student_key)
                     accepted = True
 
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                cv2.putText(frame, f"{display_name} ({conf_val:.1f})", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,0), 2)
+                if annotate:
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                    cv2.putText(frame, f"{display_name} ({conf_val:.1f})", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,0), 2)
                 if accepted:
                     print(f"Registered: {student_key} (label={label}, conf={conf_val:.2f})")
                 else:
                     print(f"Low confidence ({conf_val:.2f}) - not registered")
+        if on_frame is not None:
+            on_frame(frame)
+
+        if headless:
+            continue
+
         cv2.imshow("Attendance", frame)
         
         # optional manual stop
@@ -118,7 +134,8 @@ def detect(stop_event, result_container):
             stop_event.set()
 
     cap.release()
-    cv2.destroyAllWindows()
+    if not headless:
+        cv2.destroyAllWindows()
 
     # ✅ store result for backend
     result_container.extend(list(detected_students))
@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+
+try:
+    from . import train
+    from .face_detectors import create_detector, DetectorError, BACKENDS, CONFIDENCE
+    from .tracking import iou
+except ImportError:
+    import train
+    from face_detectors import create_detector, DetectorError, BACKENDS, CONFIDENCE
+    from tracking import iou
+
+# Compare the face detector backends (face_detectors.py) on our own images.
+#
+# --images is a folder (searched recursively). With --annotations, a JSON file
+# {"relative/path.jpg": [[x, y, w, h], ...]}, recall is the share of annotated faces
+# matched by a detection (IoU >= --iou). Without it every image is assumed to show one
+# face, as in the training dataset, and recall is the share of images with a detection.
+# DNN backends are timed with --batch images per forward().
+#
+#   python benchmark_detectors.py --images classroom --annotations classroom/faces.json
+#   python benchmark_detectors.py --backends haar ssd --batch 1 8
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_images(folder):
+    images = {}
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            image = cv2.imread(path)
+            if image is None:
+                print(f"[bench] unreadable image: {path}")
+                continue
+            images[os.path.relpath(path, folder).replace(os.sep, "/")] = image
+    return images
+
+
+def recall(found, annotations, min_iou):
+    """(matched faces, annotated faces) over all images."""
+    matched = total = 0
+    for name, boxes in found.items():
+        if annotations is None:
+            matched += bool(boxes)
+            total += 1
+            continue
+        unused = list(boxes)
+        for truth in annotations.get(name, []):
+            total += 1
+            best = max(unused, key=lambda box: iou(box, truth), default=None)
+            if best is not None and iou(best, truth) >= min_iou:
+                unused.remove(best)
+                matched += 1
+    return matched, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detector backends: recall and ms/frame")
+    parser.add_argument("--images", default=train.DATASET_DIR, help="image folder (searched recursively)")
+    parser.add_argument("--annotations", help="JSON {image path: [[x, y, w, h], ...]} relative to --images")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE, help="min score for the DNN backends")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8], help="images per forward() (DNN backends)")
+    parser.add_argument("--iou", type=float, default=0.5, help="min overlap for a detection to count")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print("[bench] ERROR: no images found in", args.images)
+        return 1
+    annotations = None
+    if args.annotations:
+        with open(args.annotations, "r", encoding="utf-8") as f:
+            annotations = json.load(f)
+    names = list(images)
+    print(f"[bench] {len(names)} images" + (f", {sum(map(len, annotations.values()))} annotated faces"
+                                             if annotations is not None else ", one face each assumed"))
+
+    for backend in args.backends:
+        try:
+            detector = create_detector(backend, args.confidence)
+        except DetectorError as exc:
+            print(f"[bench] {backend}: skipped, {exc}")
+            continue
+
+        # the cascade has no batched path: batch size doesn't change its work
+        for batch in (args.batch if backend != "haar" else [1]):
+            detector.detect_batch([images[names[0]]])  # warm-up (network allocation)
+            found = {}
+            start = time.perf_counter()
+            for i in range(0, len(names), batch):
+                chunk = names[i:i + batch]
+                for name, boxes in zip(chunk, detector.detect_batch([images[name] for name in chunk])):
+                    found[name] = boxes
+            elapsed = time.perf_counter() - start
+
+            matched, total = recall(found, annotations, args.iou)
+            faces = sum(len(boxes) for boxes in found.values())
+            print(f"[bench] {backend:>4} batch {batch:>3}: {1000 * elapsed / len(names):8.1f} ms/frame, "
+                  f"recall {matched}/{total} ({matched / max(total, 1):.1%}), {faces} detections")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import cv2
+
+try:
+    from . import train
+    from .lbph_model import LBPHModel, Thresholds, binary_path, is_current, DTYPES
+except ImportError:
+    import train
+    from lbph_model import LBPHModel, Thresholds, binary_path, is_current, DTYPES
+
+# Compare the numpy LBPH matcher (lbph_model.py) with cv2.face.LBPHFaceRecognizer.
+#
+# Faces are taken from the dataset exactly as train.py prepares them. The script checks
+# that both paths agree (labels, distances, threshold.json accept/reject decisions) and
+# times model loading and prediction, one face at a time and in batches.
+#
+#   python benchmark_lbph.py --samples 200 --batch 1 8 32
+
+THRESHOLD_PATH = os.path.join(os.path.dirname(train.MODEL_PATH), "threshold.json")
+DEFAULT_THRESHOLD = 90.0  # model_registry.DEFAULT_THRESHOLD, used without threshold.json
+
+
+def timed(fn, repeat):
+    """Best-of-repeat wall time of fn() and its last result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def load_faces(dataset_dir, samples, seed=0):
+    person_faces, _ = train.preprocess_dataset(dataset_dir)
+    faces = [face for person in person_faces for face in person]
+    if samples and len(faces) > samples:
+        idx = np.sort(np.random.default_rng(seed).choice(len(faces), samples, replace=False))
+        faces = [faces[i] for i in idx]
+    return faces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the numpy LBPH matcher against OpenCV")
+    parser.add_argument("--model", default=train.MODEL_PATH, help="LBPH .yml model")
+    parser.add_argument("--dataset", default=train.DATASET_DIR, help="dataset folder (one sub-folder per person)")
+    parser.add_argument("--thresholds", default=THRESHOLD_PATH, help="threshold.json used for accept/reject decisions")
+    parser.add_argument("--samples", type=int, default=200, help="faces to score (0 = all)")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 32], help="batch sizes for the numpy matcher")
+    parser.add_argument("--dtype", choices=DTYPES, default="float32", help="histogram storage of the numpy model")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print("[bench] ERROR: model not found:", args.model)
+        return 1
+
+    # -----------------------------
+    # LOAD
+    # -----------------------------
+    def read_yml():
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(args.model)
+        return recognizer
+
+    yml_secs, recognizer = timed(read_yml, 1)
+    print(f"[bench] OpenCV read():      {yml_secs * 1000:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = binary_path(args.model)
+        if not is_current(args.model) or LBPHModel.load(path).dtype != args.dtype:
+            # no (matching) binary model yet: time loading a converted copy
+            path = os.path.join(tmp, "model.lbph")
+            LBPHModel.from_recognizer(recognizer, dtype=args.dtype).save(path)
+        bin_secs, model = timed(lambda: LBPHModel.load(path, mmap=False), args.repeat)
+    print(f"[bench] binary load:        {bin_secs * 1000:8.1f} ms ({model.dtype})")
+    model.row_sums()  # one pass over the histograms, not part of the per-face cost
+
+    faces = load_faces(args.dataset, args.samples)
+    if not faces:
+        print("[bench] ERROR: no faces found in", args.dataset)
+        return 1
+    print(f"[bench] {len(faces)} faces vs {len(model)} training histograms")
+
+    # -----------------------------
+    # EQUIVALENCE
+    # -----------------------------
+    expected = [recognizer.predict(face) for face in faces]
+    actual = model.predict_batch(faces)
+    thresholds = Thresholds.load(args.thresholds, DEFAULT_THRESHOLD)
+
+    label_mismatches = sum(1 for (a, _), (b, _) in zip(expected, actual) if a != b)
+    decision_mismatches = sum(1 for (a, da), (b, db) in zip(expected, actual)
+                              if thresholds.accepts(a, da) != thresholds.accepts(b, db))
+    max_diff = max(abs(da - db) for (_, da), (_, db) in zip(expected, actual))
+    print(f"[bench] label mismatches: {label_mismatches}, threshold decision mismatches: "
+          f"{decision_mismatches}, max distance difference: {max_diff:.2e}")
+
+    # -----------------------------
+    # SPEED
+    # -----------------------------
+    cv_secs, _ = timed(lambda: [recognizer.predict(face) for face in faces], args.repeat)
+    cv_ms = 1000.0 * cv_secs / len(faces)
+    print(f"[bench] OpenCV predict:     {cv_ms:8.2f} ms/face")
+
+    for batch in args.batch:
+        def run():
+            return [result for i in range(0, len(faces), batch) for result in model.predict_batch(faces[i:i + batch])]
+        np_secs, _ = timed(run, args.repeat)
+        np_ms = 1000.0 * np_secs / len(faces)
+        print(f"[bench] numpy batch {batch:>4}:   {np_ms:8.2f} ms/face ({cv_ms / np_ms:.2f}x)")
+
+    return 0 if label_mismatches == 0 and decision_mismatches == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,14 @@
 import csv
+import sys
 from collections import defaultdict
 from pathlib import Path
 
 csv_path = Path(r"c:/Users/j/Desktop/git tutor/student_attendace_system/diagnosis.csv")
+out = Path(r"c:/Users/j/Desktop/git tutor/student_attendace_system/accuracy_report.txt")
+if len(sys.argv) > 1:
+    # e.g. python compute_accuracy.py diagnosis_index.csv -> accuracy_report.txt next to it
+    csv_path = Path(sys.argv[1])
+    out = csv_path.with_name('accuracy_report.txt') if len(sys.argv) < 3 else Path(sys.argv[2])
 label_names = {}
 # We'll build simple metrics: overall accuracy, per-class precision/recall, confusion counts
 
@@ -62,7 +68,6 @@ for t in sorted(confusion.keys()):
             print(f"{t} -> {p}: {c}")
 
 # Save results
-out = Path(r"c:/Users/j/Desktop/git tutor/student_attendace_system/accuracy_report.txt")
 with out.open('w', encoding='utf-8') as fo:
     fo.write(f'Total evaluated images (excluding NO_FACE): {total}\n')
     fo.write(f'Correct predictions: {correct}\n')
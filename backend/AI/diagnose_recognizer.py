@@ -2,21 +2,70 @@ import os
 import cv2
 import json
 import csv
+import time
+import argparse
 import numpy as np
 
+try:
+    from .lbph_model import LBPHModel, load_recognizer
+    from .lbph_index import PrototypeIndex, TOP_K
+    from . import embedding_backend
+    from .model_registry import student_code
+    from .face_preprocess import prepare_face
+except ImportError:
+    from lbph_model import LBPHModel, load_recognizer
+    from lbph_index import PrototypeIndex, TOP_K
+    import embedding_backend
+    from model_registry import student_code
+    from face_preprocess import prepare_face
+
 DATASET = "./student_attendace_system/dataset"
 MODEL = "./student_attendace_system/models/face_recognizer.yml"
 LABELS = "./student_attendace_system/models/labels.json"
 OUTPUT = "./student_attendace_system/diagnosis.csv"
 
+# Matchers to compare (feed each diagnosis.csv to compute_accuracy.py):
+#   opencv - cv2.face LBPH predict
+#   exact  - numpy LBPH matcher (lbph_model.py), same results as opencv
+#   index  - per-student prototypes + exact re-rank of the --top-k closest (lbph_index.py)
+#   embedding - ONNX face embeddings + embedding store (embedding_backend.py); the
+#               confidence column is 1 - cosine similarity, not an LBPH distance
+parser = argparse.ArgumentParser(description="Predict every dataset image and write diagnosis.csv")
+parser.add_argument("--dataset", default=DATASET)
+parser.add_argument("--model", default=MODEL)
+parser.add_argument("--labels", default=LABELS)
+parser.add_argument("--output", default=OUTPUT)
+parser.add_argument("--matcher", choices=("opencv", "exact", "index", "embedding"), default="opencv")
+parser.add_argument("--top-k", type=int, default=TOP_K, help="students re-ranked per face with --matcher index")
+parser.add_argument("--gallery", default=embedding_backend.STORE_PATH, help="embedding store for --matcher embedding")
+parser.add_argument("--embedding-model", default=embedding_backend.ONNX_MODEL_PATH, help="ONNX model for --matcher embedding")
+args = parser.parse_args()
+DATASET, MODEL, LABELS, OUTPUT = args.dataset, args.model, args.labels, args.output
+
 face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
 
-if not os.path.exists(MODEL):
+if args.matcher != "embedding" and not os.path.exists(MODEL):
     print("Model not found:", MODEL)
     raise SystemExit
 
-recognizer = cv2.face.LBPHFaceRecognizer_create()
-recognizer.read(MODEL)
+if args.matcher == "embedding":
+    with open(LABELS, 'r', encoding='utf-8') as f:
+        codes = {student_code(name): int(label) for label, name in json.load(f).items()}
+    try:
+        recognizer = embedding_backend.EmbeddingRecognizer.load(codes, args.gallery, args.embedding_model)
+    except embedding_backend.EmbeddingError as exc:
+        print("Embedding backend unavailable:", exc)
+        raise SystemExit
+elif args.matcher == "opencv":
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(MODEL)
+else:
+    recognizer = load_recognizer(MODEL)
+    if not isinstance(recognizer, LBPHModel):
+        recognizer = LBPHModel.from_recognizer(recognizer)
+    if args.matcher == "index":
+        recognizer = PrototypeIndex(recognizer, top_k=args.top_k)
+predict_time = 0.0
 
 with open(LABELS, 'r', encoding='utf-8') as f:
     labels_map = json.load(f)
@@ -78,15 +127,16 @@ for student_folder in sorted(os.listdir(DATASET)):
             rows.append([student_folder, img_name, 'NO_FACE', '', ''])
             continue
         # take largest face
-        x,y,w,h = max(faces, key=lambda r: r[2]*r[3])
-        face = gray[y:y+h, x:x+w]
+        box = max(faces, key=lambda r: r[2]*r[3])
         try:
-            # resize to training size (150x150 used by train.py)
-            face_resized = cv2.resize(face, (150,150))
+            # the crop train.py and recognize.py give the model
+            face_resized = prepare_face(gray, box)
         except Exception:
             rows.append([student_folder, img_name, 'BAD_FACE', '', ''])
             continue
+        start = time.perf_counter()
         label, conf = recognizer.predict(face_resized)
+        predict_time += time.perf_counter() - start
         pred_name = id_to_name.get(str(label), id_to_name.get(label, 'UNKNOWN'))
         rows.append([student_folder, img_name, str(true_id) if true_id is not None else '', str(label), float(conf)])
         counts.setdefault((str(true_id), str(label)), 0)
@@ -100,6 +150,10 @@ with open(OUTPUT, 'w', newline='', encoding='utf-8') as f:
 
 print('Diagnosis written to', OUTPUT)
 
+predicted = sum(counts.values())
+if predicted:
+    print(f'Matcher {args.matcher}: {predicted} faces, {1000 * predict_time / predicted:.2f} ms/face')
+
 # print simple confusion summary
 print('\nConfusion summary (true_id, pred_id): count')
 for k,v in sorted(counts.items(), key=lambda kv: -kv[1]):
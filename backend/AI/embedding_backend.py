@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import cv2
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional backend: pip install onnxruntime
+    ort = None
+
+try:
+    from .lbph_model import publish, NO_LABEL, NO_DISTANCE
+    from .embedding_store import EmbeddingStore, StoreError, normalize, STORE_PATH
+except ImportError:
+    from lbph_model import publish, NO_LABEL, NO_DISTANCE
+    from embedding_store import EmbeddingStore, StoreError, normalize, STORE_PATH
+
+# Deep-embedding recognizer backend (ONNX Runtime, CPU).
+#
+# A face-embedding network (FaceNet / InsightFace style, exported to ONNX and placed in
+# inference/models/) maps every face crop to a vector; faces of the same student have a
+# high cosine similarity. All crops of a frame go through the network in one run().
+#
+# The gallery is the embedding store (embedding_store.py, models/vectors/): one
+# L2-normalized embedding per student (the mean of their dataset images), keyed by student
+# code and searched exactly, or through its IVF index for large galleries. Building it
+# adds / updates students in place; --enroll embeds a single person folder.
+#
+# EmbeddingRecognizer has the LBPH interface: predict(face) / predict_batch(faces) ->
+# (label, distance) with label the student's id in labels.json and distance = 1 - cosine
+# similarity (lower = better). Matches under MATCH_THRESHOLD similarity come back as
+# (-1, DBL_MAX), like an LBPH model's threshold.
+#
+#   python embedding_backend.py --dataset dataset        # build the gallery
+#   python embedding_backend.py --enroll First_Last_35400
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+ONNX_MODEL_PATH = os.path.join(REPO_ROOT, "..", "..", "inference", "models", "face_embedding.onnx")
+LABELS_PATH = os.path.join(REPO_ROOT, "models", "labels.json")
+
+INPUT_SIZE = (112, 112)    # used when the model doesn't fix its input size
+PIXEL_MEAN = 127.5         # InsightFace / FaceNet input normalization: (pixel - 127.5) / 128
+PIXEL_STD = 128.0
+MATCH_THRESHOLD = 0.75     # min cosine similarity (see docs/MULTI_FACE_DETECTION.md)
+MAX_BATCH = 32             # crops per run() for models with a dynamic batch size
+INTRA_OP_THREADS = 0       # onnxruntime threads per run (0 = onnxruntime default)
+
+
+
+class EmbeddingError(RuntimeError):
+    pass
+
+
+class OnnxEmbedder:
+    """Face crops (gray or BGR, any size) -> L2-normalized embeddings."""
+
+    def __init__(self, model_path=ONNX_MODEL_PATH, threads=INTRA_OP_THREADS):
+        if ort is None:
+            raise EmbeddingError("onnxruntime is not installed (pip install onnxruntime)")
+        if not os.path.exists(model_path):
+            raise EmbeddingError(f"embedding model not found at {model_path} "
+                                 "(export a face-embedding network to ONNX into inference/models/)")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.model_path = model_path
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        # e.g. [None, 3, 112, 112] (NCHW, InsightFace) or ["batch", 160, 160, 3] (NHWC, FaceNet)
+        model_input = self.session.get_inputs()[0]
+        shape = model_input.shape
+        self.input_name = model_input.name
+        self.channels_first = shape[1] == 3
+        height, width = (shape[2], shape[3]) if self.channels_first else (shape[1], shape[2])
+        self.size = (width, height) if isinstance(width, int) and isinstance(height, int) else INPUT_SIZE
+        self.batch = shape[0] if isinstance(shape[0], int) and shape[0] > 0 else None
+
+    def preprocess(self, faces):
+        width, height = self.size
+        blob = np.empty((len(faces), height, width, 3), dtype=np.float32)
+        for i, face in enumerate(faces):
+            face = cv2.resize(np.asarray(face), self.size)
+            blob[i] = cv2.cvtColor(face, cv2.COLOR_GRAY2RGB if face.ndim == 2 else cv2.COLOR_BGR2RGB)
+        blob -= PIXEL_MEAN
+        blob /= PIXEL_STD
+        if self.channels_first:
+            blob = blob.transpose(0, 3, 1, 2)
+        return np.ascontiguousarray(blob)
+
+    def embed(self, faces):
+        blob = self.preprocess(faces)
+        step = self.batch or MAX_BATCH
+        outputs = []
+        for start in range(0, len(blob), step):
+            chunk = blob[start:start + step]
+            count = len(chunk)
+            if self.batch and count < self.batch:
+                # fixed-batch model: pad the last chunk
+                chunk = np.concatenate([chunk, np.zeros((self.batch - count,) + chunk.shape[1:], chunk.dtype)])
+            output = self.session.run(None, {self.input_name: chunk})[0]
+            outputs.append(output[:count].reshape(count, -1))
+        return normalize(np.concatenate(outputs).astype(np.float32))
+
+
+class EmbeddingRecognizer:
+    """Cosine matching of face embeddings against the embedding store, one vector per student."""
+
+    def __init__(self, embedder, store, labels, threshold=MATCH_THRESHOLD, codes=None):
+        # labels: {student code: label id}; codes: only search these students (None = all)
+        self.embedder = embedder
+        self.store = store
+        self.labels = labels
+        self.threshold = threshold
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.store) if self.codes is None else len(self.codes)
+
+    @classmethod
+    def load(cls, labels, store_path=STORE_PATH, model_path=ONNX_MODEL_PATH, threshold=MATCH_THRESHOLD):
+        try:
+            store = EmbeddingStore(store_path, readonly=True)
+        except (StoreError, OSError, ValueError) as exc:
+            raise EmbeddingError(f"no embedding gallery at {store_path} (run embedding_backend.py): {exc}")
+
+        if store.model != os.path.basename(model_path):
+            print(f"[embedding] gallery was built with {store.model}, rebuild it for {os.path.basename(model_path)}")
+
+        return cls(OnnxEmbedder(model_path), store, labels, threshold)
+
+    def subset(self, labels):
+        labels = set(int(label) for label in labels)
+        codes = frozenset(code for code, label in self.labels.items() if label in labels and code in self.store)
+        return EmbeddingRecognizer(self.embedder, self.store, self.labels, self.threshold, codes)
+
+    def predict_batch(self, faces):
+        if not len(faces):
+            return []
+        if not len(self):
+            return [(NO_LABEL, NO_DISTANCE)] * len(faces)
+
+        results = []
+        for found in self.store.search(self.embedder.embed(faces), 1, self.codes):
+            code, similarity = found[0] if found else (None, -1.0)
+            if similarity < self.threshold or code not in self.labels:
+                results.append((NO_LABEL, NO_DISTANCE))
+            else:
+                results.append((self.labels[code], float(1.0 - similarity)))
+        return results
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+
+# -----------------------------
+# GALLERY
+# -----------------------------
+def build_gallery(embedder, person_faces):
+    """{label id: faces} -> (embeddings, labels), one mean embedding per person with faces."""
+    embeddings, labels = [], []
+    for label_id, faces in sorted(person_faces.items()):
+        if not faces:
+            continue
+        vectors = np.concatenate([embedder.embed(faces[i:i + MAX_BATCH]) for i in range(0, len(faces), MAX_BATCH)])
+        embeddings.append(vectors.mean(axis=0))
+        labels.append(label_id)
+    dim = embeddings[0].shape[0] if embeddings else 0
+    return normalize(np.array(embeddings, dtype=np.float32).reshape(len(embeddings), dim)), labels
+
+
+def main():
+    try:
+        from . import train
+        from .model_registry import student_code
+    except ImportError:
+        import train
+        from model_registry import student_code
+
+    parser = argparse.ArgumentParser(description="Build the per-student embedding gallery")
+    parser.add_argument("--dataset", default=train.DATASET_DIR, help="dataset folder (one sub-folder per person)")
+    parser.add_argument("--enroll", metavar="FOLDER", help="only embed this person folder (added or updated)")
+    parser.add_argument("--model", default=ONNX_MODEL_PATH, help="ONNX face-embedding model")
+    parser.add_argument("--store", default=STORE_PATH, help="embedding store folder")
+    parser.add_argument("--workers", type=int, default=train.WORKERS, help="preprocessing processes")
+    args = parser.parse_args()
+
+    try:
+        embedder = OnnxEmbedder(args.model)
+    except EmbeddingError as exc:
+        print("[embedding] ERROR:", exc)
+        return 1
+
+    if args.enroll:
+        folder = args.enroll if os.path.isdir(args.enroll) else os.path.join(args.dataset, args.enroll)
+        if not os.path.isdir(folder):
+            print("[embedding] ERROR: enrollment folder not found:", folder)
+            return 1
+        dataset_labels = {0: os.path.basename(os.path.normpath(folder))}
+        person_faces = train.preprocess_folders([folder], workers=args.workers)
+    else:
+        person_faces, dataset_labels = train.preprocess_dataset(args.dataset, workers=args.workers)
+
+    # keep the label ids of labels.json (shared with the LBPH model), new people get new ids
+    label_dict = train.load_label_dict() if os.path.exists(LABELS_PATH) else {}
+    ids = {name: label_id for label_id, name in label_dict.items()}
+    faces_by_label = {}
+    for index, name in dataset_labels.items():
+        if name not in ids:
+            ids[name] = max(label_dict, default=-1) + 1
+            label_dict[ids[name]] = name
+        faces_by_label[ids[name]] = person_faces[index]
+
+    start = time.perf_counter()
+    embeddings, labels = build_gallery(embedder, faces_by_label)
+    elapsed = time.perf_counter() - start
+    samples = sum(len(faces) for faces in faces_by_label.values())
+    if not len(labels):
+        print("[embedding] ERROR: no usable face images found")
+        return 1
+
+    publish(os.path.dirname(LABELS_PATH), os.path.basename(LABELS_PATH),
+            lambda f: f.write(json.dumps(label_dict).encode("utf-8")))
+    try:
+        store = EmbeddingStore(args.store, dim=embeddings.shape[1], index=False, model=os.path.basename(args.model))
+        added, updated = store.put([student_code(label_dict[label]) for label in labels], embeddings)
+    except StoreError as exc:
+        print("[embedding] ERROR:", exc)
+        return 1
+    print(f"[embedding] {added} students added, {updated} updated from {samples} images "
+          f"({1000 * elapsed / max(samples, 1):.1f} ms/face); {len(store)} in {args.store}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
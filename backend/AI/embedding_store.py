@@ -0,0 +1,441 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+
+try:
+    from .lbph_model import publish
+except ImportError:
+    from lbph_model import publish
+
+# Embedding vector store for enrolled students: the gallery of the embedding recognizer
+# backend (embedding_backend.py).
+#
+# One L2-normalized float32 vector per student, keyed by api.Student.student_code (the
+# same code recognize.py reads from label names). Layout (a directory, e.g. models/vectors/):
+#   vectors.npy - (capacity, dim) float32, memory-mapped; row i belongs to ids[i]
+#   ids.json    - {"version", "dim", "model", "ids": [student code or null per row]}
+#                 ("model": the embedding network the vectors come from)
+#
+# add() / update() / remove() write single rows of the mapped matrix in place and then
+# republish ids.json, so enrolling or removing a student never rewrites the other vectors.
+# Removed rows become free and are reused by the next add(); the file only grows (doubling)
+# when no free row is left. ids.json is replaced last, so a reader never maps a code to a
+# row that wasn't written yet.
+#
+# search() is an exact batched cosine top-k (one matrix product per block of rows). For
+# galleries above ANN_MIN_COUNT students an IVF index (k-means lists, probing the NPROBE
+# closest) is built on open and kept in step with add/update/remove; build_index() redoes
+# the clustering after large changes. IVF queries are grouped by list, so every probed list
+# is scored once for all the queries probing it.
+#
+# Students are added / updated by embedding_backend.py (gallery build, --enroll) and removed
+# when their api.Student is deleted (remove_students()). Readers (the model registry) open
+# the store read-only and reopen it when ids.json changes.
+#
+#   python embedding_store.py remove 35400 35402        # drop students by code
+#   python embedding_store.py bench --count 20000       # exact vs IVF, recall and ms/query
+
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "vectors")
+
+STORE_VERSION = 1
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "ids.json"
+MIN_CAPACITY = 64          # rows allocated for a new store
+SEARCH_BLOCK = 1 << 14     # gallery rows scored per matrix product
+ANN_MIN_COUNT = 10000      # build the IVF index from this many students on
+NPROBE = 8                 # IVF lists searched per query
+KMEANS_ITERATIONS = 10
+
+
+class StoreError(RuntimeError):
+    pass
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _top_k(scores, k):
+    """Column indices of the k highest scores per row, best first."""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class IVFIndex:
+    """Inverted-file index over a store's rows: each row sits in the list of its closest centroid."""
+
+    def __init__(self, store, nlist=None, nprobe=NPROBE, seed=0):
+        self.store = store
+        self.nprobe = nprobe
+        rows = np.flatnonzero(store.valid)
+        vectors = np.asarray(store.vectors[rows])
+        nlist = nlist or max(1, int(np.sqrt(len(rows))))
+        self.centroids = self._kmeans(vectors, min(nlist, len(rows)), np.random.default_rng(seed))
+        assignment = self._assign(vectors)
+        self.lists = [rows[assignment == c] for c in range(len(self.centroids))]
+        self.where = dict(zip(rows.tolist(), assignment.tolist()))
+
+    @staticmethod
+    def _kmeans(vectors, nlist, rng):
+        # spherical k-means: vectors and centroids are unit length, similarity = dot product
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize(sums)
+        return centroids
+
+    def _assign(self, vectors):
+        return np.argmax(np.asarray(vectors, dtype=np.float32) @ self.centroids.T, axis=1)
+
+    def add(self, row, vector):
+        c = int(self._assign(vector[None])[0])
+        self.lists[c] = np.append(self.lists[c], row)
+        self.where[row] = c
+
+    def remove(self, row):
+        c = self.where.pop(row, None)
+        if c is not None:
+            self.lists[c] = self.lists[c][self.lists[c] != row]
+
+    def probes(self, queries):
+        """(queries, nprobe) indices of every query's closest lists."""
+        return _top_k(queries @ self.centroids.T, self.nprobe)
+
+
+class EmbeddingStore:
+    """Student code -> embedding, on disk as a memory-mapped matrix."""
+
+    def __init__(self, path=STORE_PATH, dim=None, index=None, readonly=False, model=None):
+        """
+        Open the store at path; dim creates it when missing. index: None builds the IVF
+        index from ANN_MIN_COUNT students on, True / False force it on / off. readonly
+        maps the vectors read-only (searching processes). model names the embedding
+        network of a new store.
+        """
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        meta_path = os.path.join(path, IDS_FILE)
+
+        if not os.path.exists(meta_path):
+            if dim is None or readonly:
+                raise StoreError(f"no embedding store at {path} (pass dim to create one)")
+            os.makedirs(path, exist_ok=True)
+            self.dim = int(dim)
+            self.model = model
+            self.ids = []
+            self._allocate(MIN_CAPACITY)
+            self._publish_ids()
+        else:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != STORE_VERSION:
+                raise StoreError(f"{path} is from another store version")
+            if dim is not None and int(dim) != meta["dim"]:
+                raise StoreError(f"{path} holds {meta['dim']}-d vectors, not {dim}-d")
+            self.dim = meta["dim"]
+            self.model = meta.get("model")
+            self.ids = meta["ids"]
+            self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r" if readonly else "r+")
+            if len(self.vectors) < len(self.ids) or self.vectors.shape[1] != self.dim:
+                raise StoreError(f"{path} is incomplete")
+
+        self.ids += [None] * (len(self.vectors) - len(self.ids))
+        self.rows = {code: row for row, code in enumerate(self.ids) if code is not None}
+        self.valid = np.array([code is not None for code in self.ids], dtype=bool)
+        self.index = None
+        if index or (index is None and len(self) >= ANN_MIN_COUNT):
+            self.build_index()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, code):
+        return code in self.rows
+
+    # -----------------------------
+    # STORAGE
+    # -----------------------------
+    def _allocate(self, capacity):
+        """(Re)write vectors.npy with room for capacity rows, keeping the current rows."""
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        if getattr(self, "vectors", None) is not None:
+            vectors[:len(self.vectors)] = self.vectors
+        publish(self.path, VECTORS_FILE, lambda f: np.save(f, vectors))
+        self.vectors = np.load(os.path.join(self.path, VECTORS_FILE), mmap_mode="r+")
+
+    def _publish_ids(self):
+        meta = {"version": STORE_VERSION, "dim": self.dim, "model": self.model, "ids": self.ids}
+        publish(self.path, IDS_FILE, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+
+    def _free_row(self):
+        free = np.flatnonzero(~self.valid)
+        if len(free):
+            return int(free[0])
+        row = len(self.ids)
+        self._allocate(max(MIN_CAPACITY, 2 * len(self.ids)))
+        self.ids += [None] * (len(self.vectors) - len(self.ids))
+        self.valid = np.concatenate([self.valid, np.zeros(len(self.vectors) - len(self.valid), dtype=bool)])
+        return row
+
+    def _vectors(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        return normalize(vectors)
+
+    # -----------------------------
+    # CHANGES
+    # -----------------------------
+    def _writable(self):
+        if self.readonly:
+            raise StoreError(f"{self.path} is open read-only")
+
+    def add(self, codes, vectors):
+        """Insert new students (a code or a list of codes, one vector each)."""
+        self._writable()
+        codes = [codes] if isinstance(codes, str) else list(codes)
+        vectors = self._vectors(vectors)
+        if len(codes) != len(vectors):
+            raise ValueError(f"{len(codes)} codes for {len(vectors)} vectors")
+        with self._lock:
+            existing = [code for code in codes if code in self.rows]
+            if existing or len(set(codes)) != len(codes):
+                raise ValueError(f"already stored or duplicated: {existing or codes}")
+            for code, vector in zip(codes, vectors):
+                row = self._free_row()
+                self.vectors[row] = vector
+                self._set(row, code, vector)
+            self._commit()
+
+    def update(self, codes, vectors):
+        """Replace the vectors of stored students."""
+        self._writable()
+        codes = [codes] if isinstance(codes, str) else list(codes)
+        vectors = self._vectors(vectors)
+        if len(codes) != len(vectors):
+            raise ValueError(f"{len(codes)} codes for {len(vectors)} vectors")
+        with self._lock:
+            missing = [code for code in codes if code not in self.rows]
+            if missing:
+                raise KeyError(f"not in the store: {missing}")
+            for code, vector in zip(codes, vectors):
+                row = self.rows[code]
+                self.vectors[row] = vector
+                if self.index is not None:
+                    self.index.remove(row)
+                    self.index.add(row, vector)
+            self._commit()
+
+    def put(self, codes, vectors):
+        """add() the new students, update() the stored ones. Returns (added, updated)."""
+        codes = [codes] if isinstance(codes, str) else list(codes)
+        vectors = self._vectors(vectors)
+        new = [i for i, code in enumerate(codes) if code not in self.rows]
+        old = [i for i, code in enumerate(codes) if code in self.rows]
+        if new:
+            self.add([codes[i] for i in new], vectors[new])
+        if old:
+            self.update([codes[i] for i in old], vectors[old])
+        return len(new), len(old)
+
+    def remove(self, codes):
+        """Delete students; unknown codes are ignored. Returns how many were removed."""
+        self._writable()
+        codes = [codes] if isinstance(codes, str) else list(codes)
+        with self._lock:
+            removed = 0
+            for code in codes:
+                row = self.rows.pop(code, None)
+                if row is None:
+                    continue
+                self.ids[row] = None
+                self.valid[row] = False
+                self.vectors[row] = 0.0
+                if self.index is not None:
+                    self.index.remove(row)
+                removed += 1
+            if removed:
+                self._commit()
+            return removed
+
+    def prune(self, codes):
+        """Remove every student not in codes, e.g. Student.objects.values_list("student_code", flat=True)."""
+        keep = set(codes)
+        return self.remove([code for code in list(self.rows) if code not in keep])
+
+    def _set(self, row, code, vector):
+        self.ids[row] = code
+        self.rows[code] = row
+        self.valid[row] = True
+        if self.index is not None:
+            self.index.add(row, vector)
+
+    def _commit(self):
+        self.vectors.flush()  # rows on disk before ids.json points at them
+        self._publish_ids()
+
+    def build_index(self, nlist=None, nprobe=NPROBE):
+        """(Re)cluster the IVF index, e.g. after many additions."""
+        with self._lock:
+            self.index = IVFIndex(self, nlist, nprobe) if len(self) else None
+
+    # -----------------------------
+    # SEARCH
+    # -----------------------------
+    def get(self, code):
+        return np.array(self.vectors[self.rows[code]])
+
+    def search(self, queries, k=1, codes=None, exact=False):
+        """
+        Top-k students per query vector: [[(code, cosine similarity), ...], ...], best first.
+        codes restricts the search to those students (e.g. one section); exact skips the
+        IVF index.
+        """
+        queries = self._vectors(queries)
+        if codes is not None:
+            rows = np.array(sorted(self.rows[code] for code in set(codes) if code in self.rows), dtype=np.int64)
+            return self._scan(queries, k, rows)
+        if self.index is not None and not exact:
+            return self._search_index(queries, k)
+        return self._scan(queries, k, None)
+
+    def _results(self, best_rows, best_scores):
+        return [[(self.ids[row], float(score)) for row, score in zip(rows_, scores_) if score > -np.inf]
+                for rows_, scores_ in zip(best_rows, best_scores)]
+
+    def _scan(self, queries, k, rows):
+        """Exact top-k over the given rows (None = every valid row), block by block."""
+        total = len(self.ids) if rows is None else len(rows)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, SEARCH_BLOCK):
+            if rows is None:
+                block = np.arange(start, min(start + SEARCH_BLOCK, total))
+                scores = queries @ np.asarray(self.vectors[start:start + SEARCH_BLOCK]).T
+                scores[:, ~self.valid[start:start + SEARCH_BLOCK]] = -np.inf
+            else:
+                block = rows[start:start + SEARCH_BLOCK]
+                scores = queries @ np.asarray(self.vectors[block]).T
+            best_scores, best_rows = _merge(best_scores, best_rows, scores, block, k)
+        return self._results(best_rows, best_scores)
+
+    def _search_index(self, queries, k):
+        """IVF top-k: each probed list is scored once, for all the queries probing it."""
+        probes = self.index.probes(queries)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), k), dtype=np.int64)
+        for c in np.unique(probes):
+            rows = self.index.lists[c]
+            if not len(rows):
+                continue
+            members = np.flatnonzero((probes == c).any(axis=1))
+            scores = queries[members] @ np.asarray(self.vectors[rows]).T
+            best_scores[members], best_rows[members] = _merge(best_scores[members], best_rows[members],
+                                                              scores, rows, k)
+        return self._results(best_rows, best_scores)
+
+
+def _merge(best_scores, best_rows, scores, rows, k):
+    """Running top-k: the current best (scores, rows) merged with scores of some more rows."""
+    scores = np.concatenate([best_scores, scores], axis=1)
+    candidates = np.concatenate([best_rows, np.broadcast_to(rows, (len(scores), len(rows)))], axis=1)
+    top = _top_k(scores, k)
+    return np.take_along_axis(scores, top, axis=1), np.take_along_axis(candidates, top, axis=1)
+
+
+def remove_students(codes, path=STORE_PATH):
+    """Drop students from the store at path, if there is one (api.Student deletion)."""
+    if not os.path.exists(os.path.join(path, IDS_FILE)):
+        return 0
+    return EmbeddingStore(path, index=False).remove(codes)
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def bench(count, dim, queries, k, nprobe, seed=0):
+    """Exact vs IVF search on a synthetic gallery: ms/query, hit rate and overlap with the exact top-k."""
+    import tempfile
+
+    rng = np.random.default_rng(seed)
+    gallery = normalize(rng.standard_normal((count, dim)).astype(np.float32))
+    # queries: noisy copies of enrolled students, as a second photo of them would be
+    truth = rng.choice(count, queries, replace=False)
+    probes = normalize(gallery[truth] + 0.05 * rng.standard_normal((queries, dim)).astype(np.float32))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EmbeddingStore(tmp, dim=dim, index=False)
+        start = time.perf_counter()
+        store.add([f"S{i:06d}" for i in range(count)], gallery)
+        print(f"[store] add {count}:     {time.perf_counter() - start:8.2f} s")
+
+        start = time.perf_counter()
+        exact = store.search(probes, k)
+        exact_ms = 1000 * (time.perf_counter() - start) / queries
+        codes = [f"S{i:06d}" for i in truth]
+        exact_hits = np.mean([bool(e) and e[0][0] == code for e, code in zip(exact, codes)])
+        print(f"[store] exact search: {exact_ms:8.2f} ms/query, right student first {exact_hits:.3f}")
+
+        start = time.perf_counter()
+        store.build_index(nprobe=nprobe)
+        print(f"[store] IVF build:    {time.perf_counter() - start:8.2f} s ({len(store.index.centroids)} lists)")
+        start = time.perf_counter()
+        approx = store.search(probes, k)
+        ivf_ms = 1000 * (time.perf_counter() - start) / queries
+
+        hits = np.mean([bool(a) and a[0][0] == code for a, code in zip(approx, codes)])
+        recall = np.mean([len({c for c, _ in a} & {c for c, _ in e}) / max(len(e), 1)
+                          for a, e in zip(approx, exact)])
+        print(f"[store] IVF search:   {ivf_ms:8.2f} ms/query (nprobe {nprobe}), right student first {hits:.3f}, "
+              f"recall@{k} {recall:.3f}")
+
+        start = time.perf_counter()
+        store.remove([f"S{i:06d}" for i in range(0, count, 10)])
+        store.add([f"N{i:06d}" for i in range(count // 10)], gallery[:count // 10])
+        print(f"[store] remove + add {count // 10}: {time.perf_counter() - start:.2f} s (no rebuild)")
+        del store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Student embedding store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rm = sub.add_parser("remove", help="delete students from the store")
+    rm.add_argument("codes", nargs="+")
+    rm.add_argument("--store", default=STORE_PATH)
+
+    bn = sub.add_parser("bench", help="exact vs IVF search on synthetic vectors")
+    bn.add_argument("--count", type=int, default=20000)
+    bn.add_argument("--dim", type=int, default=512)
+    bn.add_argument("--queries", type=int, default=200)
+    bn.add_argument("-k", type=int, default=5)
+    bn.add_argument("--nprobe", type=int, default=NPROBE)
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "remove":
+            store = EmbeddingStore(args.store, index=False)
+            print(f"[store] removed {store.remove(args.codes)}, {len(store)} students left")
+        else:
+            bench(args.count, args.dim, args.queries, args.k, args.nprobe)
+    except (StoreError, OSError, ValueError) as exc:
+        print("[store] ERROR:", exc)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# Persistent cache of preprocessed training faces.
+#
+# Layout (inside cache_dir):
+#   faces.npy   - (N, H, W) uint8 array of cropped, CLAHE-equalized faces (memory-mapped on load)
+#   index.json  - {"version", "params", "entries": {sha1 of image bytes: row in faces.npy or -1}}
+#
+# Entries are keyed by image content, so renaming/moving a file is still a hit and an edited
+# file is a miss. "params" is a fingerprint of the detector settings: when it changes the
+# whole cache is discarded. Entries not looked up during a run are evicted on save()
+# (enrollment runs save with evict=False since they only see one person).
+
+INDEX_VERSION = 1
+NO_FACE = -1
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def params_fingerprint(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class FaceCache:
+
+    def __init__(self, cache_dir, params):
+        self.cache_dir = cache_dir
+        self.faces_path = os.path.join(cache_dir, "faces.npy")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.face_size = tuple(params["face_size"])
+        self.fingerprint = params_fingerprint(params)
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = {}   # key -> row in faces.npy (or NO_FACE)
+        self._faces = None   # memory-mapped faces.npy
+        self._new = {}       # key -> face (or None) computed during this run
+        self._seen = set()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as exc:
+            print("[cache] ignoring unreadable index:", exc)
+            return
+
+        if index.get("version") != INDEX_VERSION or index.get("params") != self.fingerprint:
+            print("[cache] detector settings changed, invalidating face cache")
+            return
+
+        entries = index.get("entries", {})
+        if any(row != NO_FACE for row in entries.values()):
+            if not os.path.exists(self.faces_path):
+                print("[cache] faces.npy missing, invalidating face cache")
+                return
+            self._faces = np.load(self.faces_path, mmap_mode="r")
+        self._entries = entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        # membership only: doesn't count as a hit or keep the entry from eviction
+        return key in self._new or key in self._entries
+
+    def get(self, key):
+        """Return (hit, face). face is None for images cached as unreadable / without a face."""
+        self._seen.add(key)
+
+        if key in self._new:
+            self.hits += 1
+            return True, self._new[key]
+
+        row = self._entries.get(key)
+        if row is None:
+            self.misses += 1
+            return False, None
+
+        self.hits += 1
+        if row == NO_FACE:
+            return True, None
+        # copy out of the mmap so save() can safely replace the file afterwards
+        return True, np.array(self._faces[row])
+
+    def put(self, key, face):
+        self._seen.add(key)
+        self._new[key] = face
+
+    def clear(self):
+        self._entries = {}
+        self._faces = None
+        self._new = {}
+        self._seen = set()
+        for path in (self.index_path, self.faces_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def save(self, evict=True):
+        """
+        Write new entries and, with evict=True, drop keys not seen this run.
+        Returns the number of evicted entries.
+        """
+        kept = self._seen if evict else self._entries.keys() | self._seen
+        live = {k: row for k, row in self._entries.items() if k in kept and k not in self._new}
+        evicted = len([k for k in self._entries if k not in kept])
+
+        if not self._new and not evicted and os.path.exists(self.index_path):
+            return 0
+
+        entries = {}
+        sources = []  # (key, source array, row or None)
+        for key, row in live.items():
+            if row == NO_FACE:
+                entries[key] = NO_FACE
+            else:
+                sources.append((key, self._faces, row))
+        for key, face in self._new.items():
+            if face is None:
+                entries[key] = NO_FACE
+            else:
+                sources.append((key, face, None))
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_faces = self.faces_path + ".tmp.npy"
+        tmp_index = self.index_path + ".tmp"
+
+        if sources:
+            # stream rows into a new file instead of stacking everything in memory
+            out = np.lib.format.open_memmap(tmp_faces, mode="w+", dtype=np.uint8,
+                                            shape=(len(sources),) + self.face_size)
+            for i, (key, src, row) in enumerate(sources):
+                out[i] = src if row is None else src[row]
+                entries[key] = i
+            out.flush()
+            del out
+        else:
+            np.save(tmp_faces, np.empty((0,) + self.face_size, dtype=np.uint8))
+
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "params": self.fingerprint, "entries": entries}, f)
+
+        # release our mmap before replacing the file (required on Windows)
+        self._faces = None
+        os.replace(tmp_faces, self.faces_path)
+        os.replace(tmp_index, self.index_path)
+
+        self._entries = entries
+        self._faces = np.load(self.faces_path, mmap_mode="r") if sources else None
+        self._new = {}
+        return evicted
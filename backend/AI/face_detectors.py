@@ -0,0 +1,159 @@
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+import cv2
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional backend: pip install onnxruntime
+    ort = None
+
+# Selectable face detectors.
+#
+#   haar - OpenCV Haar cascade (the default, no model files needed)
+#   ssd  - OpenCV DNN res10 300x300 SSD (models/deploy.prototxt +
+#          models/res10_300x300_ssd_iter_140000.caffemodel, as in train.py's old DNN code)
+#   onnx - an SSD-style ONNX detector run with onnxruntime (inference/models/face_detector.onnx);
+#          it must take an NCHW BGR blob like res10 and return res10's detection layout
+#
+# Every detector is called with gray or BGR images and returns (x, y, w, h) boxes; the
+# *_batch methods take several images (frames, tiles) and, for the DNN backends, run them
+# as one blob through the network. Detections below the confidence threshold are dropped.
+# A detector instance is not thread-safe (neither cascades nor dnn.Net are); borrow one
+# per thread from model_registry's detector() pool.
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+SSD_CONFIG = os.path.join(REPO_ROOT, "models", "deploy.prototxt")
+SSD_WEIGHTS = os.path.join(REPO_ROOT, "models", "res10_300x300_ssd_iter_140000.caffemodel")
+ONNX_DETECTOR_PATH = os.path.join(REPO_ROOT, "..", "..", "inference", "models", "face_detector.onnx")
+CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+DETECTOR_BACKEND = os.environ.get("CAVS_DETECTOR", "haar")  # "haar", "ssd" or "onnx"
+BACKENDS = ("haar", "ssd", "onnx")
+CONFIDENCE = 0.5               # min detection score for the DNN backends
+SSD_SIZE = (300, 300)          # network input size
+SSD_MEAN = (104.0, 177.0, 123.0)
+HAAR_SCALE_FACTOR = 1.3        # recognize.py's detectMultiScale settings
+HAAR_MIN_NEIGHBORS = 5
+
+
+class DetectorError(RuntimeError):
+    pass
+
+
+def _bgr(image):
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+
+
+class FaceDetector(ABC):
+    """Base of the detectors: subclasses implement detect_scored_batch()."""
+    name = None
+
+    @abstractmethod
+    def detect_scored_batch(self, images):
+        """[[((x, y, w, h), score), ...] per image]."""
+
+    def detect_batch(self, images):
+        return [[box for box, _ in found] for found in self.detect_scored_batch(images)]
+
+    def __call__(self, image):
+        return self.detect_batch([image])[0]
+
+
+class HaarDetector(FaceDetector):
+    name = "haar"
+
+    def __init__(self, cascade_path=CASCADE_PATH, scale_factor=HAAR_SCALE_FACTOR, min_neighbors=HAAR_MIN_NEIGHBORS):
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise DetectorError(f"could not load Haar cascade {cascade_path}")
+
+    def detect_scored_batch(self, images):
+        # the cascade gives no scores, so 1.0
+        results = []
+        for image in images:
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            boxes = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors)
+            results.append([(tuple(int(v) for v in box), 1.0) for box in boxes])
+        return results
+
+
+class BlobDetector(FaceDetector):
+    """Networks with res10's input blob and output layout; subclasses implement _forward()."""
+
+    def __init__(self, confidence=CONFIDENCE, size=SSD_SIZE):
+        self.confidence = confidence
+        self.size = size
+
+    @abstractmethod
+    def _forward(self, blob):
+        """Network output for an NCHW blob, in res10's (1, 1, N, 7) layout."""
+
+    def detect_scored_batch(self, images):
+        if not len(images):
+            return []
+        blob = cv2.dnn.blobFromImages([cv2.resize(_bgr(image), self.size) for image in images],
+                                      1.0, self.size, SSD_MEAN)
+        # (1, 1, N, 7): image index in the batch, class, score, x1, y1, x2, y2 (relative)
+        detections = self._forward(blob).reshape(-1, 7)
+        detections = detections[detections[:, 2] >= self.confidence]
+
+        results = [[] for _ in images]
+        for index, _, score, x1, y1, x2, y2 in detections:
+            index = int(index)
+            if not 0 <= index < len(images):
+                continue
+            height, width = images[index].shape[:2]
+            x1, x2 = max(0, int(x1 * width)), min(width, int(x2 * width))
+            y1, y2 = max(0, int(y1 * height)), min(height, int(y2 * height))
+            if x2 > x1 and y2 > y1:
+                results[index].append(((x1, y1, x2 - x1, y2 - y1), float(score)))
+        return results
+
+
+class SSDDetector(BlobDetector):
+    """res10 SSD through cv2.dnn; all images of a batch go through one forward()."""
+    name = "ssd"
+
+    def __init__(self, config=SSD_CONFIG, weights=SSD_WEIGHTS, confidence=CONFIDENCE, size=SSD_SIZE):
+        super().__init__(confidence, size)
+        if not os.path.exists(weights) or (config and not os.path.exists(config)):
+            raise DetectorError(f"SSD model files not found ({config}, {weights}); download deploy.prototxt "
+                                "and res10_300x300_ssd_iter_140000.caffemodel into models/")
+        self.net = cv2.dnn.readNet(weights, config or "")
+
+    def _forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward()
+
+
+class OnnxDetector(BlobDetector):
+    """SSD-style ONNX detector run with onnxruntime (same input blob and output layout as res10)."""
+    name = "onnx"
+
+    def __init__(self, model_path=ONNX_DETECTOR_PATH, confidence=CONFIDENCE, size=SSD_SIZE):
+        if ort is None:
+            raise DetectorError("onnxruntime is not installed (pip install onnxruntime)")
+        if not os.path.exists(model_path):
+            raise DetectorError(f"ONNX detector not found at {model_path}")
+        self.session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        shape = self.session.get_inputs()[0].shape
+        super().__init__(confidence, (shape[3], shape[2]) if all(isinstance(v, int) for v in shape[2:4]) else size)
+
+    def _forward(self, blob):
+        return self.session.run(None, {self.input_name: blob.astype(np.float32)})[0]
+
+
+def create_detector(backend=DETECTOR_BACKEND, confidence=CONFIDENCE, cascade_path=CASCADE_PATH):
+    """Detector for a backend name; raises DetectorError when its model files are missing."""
+    if backend == "haar":
+        return HaarDetector(cascade_path)
+    if backend == "ssd":
+        return SSDDetector(confidence=confidence)
+    if backend == "onnx":
+        return OnnxDetector(confidence=confidence)
+    raise DetectorError(f"unknown detector backend {backend!r} (expected one of {BACKENDS})")
+
@@ -0,0 +1,30 @@
+import threading
+import cv2
+
+# Face crop preparation shared by training and recognition.
+#
+# The LBPH model only matches crops prepared the way it was trained on, so train.py (the
+# training set, the held-out calibration images and the face cache), recognize.py and
+# photo_recognition.py all turn a detected box into a model input with prepare_face():
+# the gray face region, CLAHE-equalized, resized to FACE_SIZE.
+
+FACE_SIZE = (150, 150)
+CLAHE_CLIP_LIMIT = 2.0
+CLAHE_TILE_GRID = (8, 8)
+
+# a CLAHE object per thread: apply() keeps internal buffers, and cv2 objects can't be
+# pickled to train.py's pool processes
+_local = threading.local()
+
+
+def _clahe():
+    clahe = getattr(_local, "clahe", None)
+    if clahe is None:
+        clahe = _local.clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+    return clahe
+
+
+def prepare_face(gray, box):
+    """Gray image + (x, y, w, h) face box -> CLAHE-equalized FACE_SIZE crop."""
+    x, y, w, h = (int(v) for v in box)
+    return cv2.resize(_clahe().apply(gray[y:y+h, x:x+w]), FACE_SIZE)
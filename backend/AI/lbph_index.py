@@ -0,0 +1,62 @@
+import numpy as np
+
+try:
+    from .lbph_model import chi_square, NO_LABEL, NO_DISTANCE
+except ImportError:
+    from lbph_model import chi_square, NO_LABEL, NO_DISTANCE
+
+# Two-stage search over an LBPHModel.
+#
+# Exact LBPH matching compares a face with every training histogram, and train.py stores
+# two per image (original + flip), so the cost grows with the whole gallery. The index
+# keeps one prototype per student (the mean of their histograms, itself a normalized
+# LBPH histogram): stage one scores the face against the prototypes and keeps the TOP_K
+# closest students, stage two re-ranks only those students' samples with the exact
+# distance. With TOP_K >= number of students the result is identical to the exact scan;
+# below that the best match can be missed if its student isn't among the candidates, so
+# check accuracy with diagnose_recognizer.py --matcher index / compute_accuracy.py.
+
+TOP_K = 10  # students re-ranked exactly per face
+
+
+class PrototypeIndex:
+    """predict() / predict_batch() like LBPHModel, via per-class prototypes + exact re-rank."""
+
+    def __init__(self, model, top_k=TOP_K):
+        self.model = model
+        self.top_k = max(1, int(top_k))
+
+        self.classes, inverse = np.unique(model.labels, return_inverse=True)
+        self.rows = [np.flatnonzero(inverse == c) for c in range(len(self.classes))]
+
+        self.prototypes = np.empty((len(self.classes), model.histograms.shape[1]), dtype=np.float32)
+        for c, rows in enumerate(self.rows):
+            self.prototypes[c] = np.asarray(model.histograms[rows], dtype=np.float32).mean(axis=0)
+        self.prototype_sums = self.prototypes.sum(axis=1, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.model)
+
+    def candidates(self, queries, query_sums):
+        """Per query, the sorted training rows of its top_k closest classes."""
+        coarse = chi_square(self.prototypes, self.prototype_sums, queries, query_sums)
+        k = min(self.top_k, len(self.classes))
+        nearest = np.argpartition(coarse, k - 1, axis=1)[:, :k]
+        return [np.sort(np.concatenate([self.rows[c] for c in classes])) for classes in nearest]
+
+    def predict_batch(self, faces):
+        if not len(faces):
+            return []
+        if not len(self):
+            return [(NO_LABEL, NO_DISTANCE)] * len(faces)
+
+        model = self.model
+        queries, query_sums = model.queries(faces)
+        results = []
+        for i, rows in enumerate(self.candidates(queries, query_sums)):
+            distances = chi_square(model.histograms, model.row_sums(), queries[i:i + 1], query_sums[i:i + 1], rows)
+            results.append(model.best(2.0 * model.scale * distances[0], rows))
+        return results
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
@@ -0,0 +1,632 @@
+import io
+import os
+import sys
+import json
+import math
+import argparse
+import numpy as np
+
+# Binary LBPH model format.
+#
+# cv2.face LBPH models are saved as text YAML: every training sample's 16384-bin histogram
+# printed as decimal text. Writing, and above all read()ing, that file dominates session
+# start-up. This module stores the same model as plain numpy arrays.
+#
+# Layout (a directory next to the .yml, e.g. models/face_recognizer.lbph/):
+#   histograms.npy - (N, grid_x * grid_y * 2**neighbors) float32, or uint16 bin counts
+#   labels.npy     - (N,) int32 label of every histogram
+#   meta.json      - {"version", "radius", "neighbors", "grid_x", "grid_y", "threshold",
+#                     "dtype", "scale", "count", "source", "yml_count", "images"}
+#
+# histograms.npy is memory-mapped on load, so opening a model costs next to nothing and the
+# pages are shared by every process using it. uint16 stores raw per-cell bin counts (half
+# the size of float32); "scale" turns stored values back into OpenCV's normalized
+# histograms. "source" is the (mtime_ns, size) of the .yml the model was written with: a
+# .yml replaced by something else (another trainer, a copied model) makes the binary
+# model stale and loaders fall back to the .yml.
+#
+# Enrollment (train.py --enroll) append()s a person's histograms to the binary model in
+# place instead of rewriting the .yml: the binary model then holds more rows than the .yml
+# ("yml_count"), still stamped with it, so loaders keep using it, and the .yml is marked
+# stale (<model>.yml.stale) until `--to-yml` rewrites it from the binary model, for OpenCV
+# tools that read it. "images" maps the file hash of every image the model was trained or
+# enrolled with to its label, so enrolling the same image twice adds nothing.
+#
+# LBPHModel.predict() reproduces cv2.face.LBPHFaceRecognizer.predict() (same circular LBP,
+# spatial histograms and chi-square distance), so thresholds calibrated for OpenCV apply.
+
+FORMAT_VERSION = 1
+HISTOGRAMS_FILE = "histograms.npy"
+LABELS_FILE = "labels.npy"
+META_FILE = "meta.json"
+STALE_SUFFIX = ".stale"  # next to a .yml that misses rows of its binary model
+DTYPES = ("float32", "uint16")
+MATCH_BLOCK = 1 << 16  # (histograms x bins) per matching step, sized to stay in cache
+
+FLT_EPSILON = np.finfo(np.float32).eps
+NO_LABEL = -1
+NO_DISTANCE = sys.float_info.max  # what OpenCV returns when nothing is below the threshold
+
+
+class ModelFormatError(ValueError):
+    pass
+
+
+def binary_path(model_path):
+    """Directory of the binary model belonging to a .yml model path."""
+    return os.path.splitext(model_path)[0] + ".lbph"
+
+
+def publish(directory, name, write):
+    """Write directory/name through write(file) under a temporary name, then os.replace() it."""
+    final = os.path.join(directory, name)
+    tmp = final + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, final)
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+# -----------------------------
+# LBP FEATURES (as in OpenCV's lbph_faces.cpp)
+# -----------------------------
+def lbp_image(face, radius=1, neighbors=8):
+    """
+    Circular (extended) LBP codes of a grayscale face, bilinear-interpolated like OpenCV.
+    Also takes a (B, H, W) stack of equally sized faces.
+    """
+    src = np.asarray(face)
+    rows, cols = src.shape[-2:]
+    center = src[..., radius:rows - radius, radius:cols - radius].astype(np.float32)
+    dst = np.zeros(center.shape, dtype=np.int32)
+    src = src.astype(np.float32)
+
+    def shifted(dy, dx):
+        return src[..., radius + dy:rows - radius + dy, radius + dx:cols - radius + dx]
+
+    for n in range(neighbors):
+        # sample points are computed in double and stored as float, as OpenCV does
+        x = np.float32(radius * math.cos(2.0 * math.pi * n / float(neighbors)))
+        y = np.float32(-radius * math.sin(2.0 * math.pi * n / float(neighbors)))
+        fx, fy = int(math.floor(x)), int(math.floor(y))
+        cx, cy = int(math.ceil(x)), int(math.ceil(y))
+        tx, ty = x - np.float32(fx), y - np.float32(fy)
+        one = np.float32(1)
+        w1, w2 = (one - tx) * (one - ty), tx * (one - ty)
+        w3, w4 = (one - tx) * ty, tx * ty
+
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        dst += ((t > center) | (np.abs(t - center) < FLT_EPSILON)).astype(np.int32) << n
+
+    return dst
+
+
+def cell_counts(lbp, num_patterns, grid_x=8, grid_y=8):
+    """
+    (..., grid_x * grid_y, num_patterns) bin counts of LBP image(s), cells in row-major
+    order, and the number of pixels per cell.
+    """
+    lead = lbp.shape[:-2]
+    height, width = lbp.shape[-2] // grid_y, lbp.shape[-1] // grid_x
+    cells = (lbp[..., :grid_y * height, :grid_x * width]
+             .reshape(-1, grid_y, height, grid_x, width)
+             .transpose(0, 1, 3, 2, 4)
+             .reshape(-1, height * width))
+    offsets = np.arange(len(cells))[:, None] * num_patterns
+    counts = np.bincount((cells + offsets).ravel(), minlength=len(cells) * num_patterns)
+    return counts.reshape(lead + (grid_y * grid_x, num_patterns)), height * width
+
+
+def spatial_histogram(face, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    """
+    The float32 LBPH feature vector OpenCV computes for a face; (B, features) for a
+    (B, H, W) stack of faces.
+    """
+    counts, cell_size = cell_counts(lbp_image(face, radius, neighbors), 2 ** neighbors, grid_x, grid_y)
+    histogram = (counts * (1.0 / cell_size)).astype(np.float32)
+    return histogram.reshape(histogram.shape[:-2] + (-1,))
+
+
+def chi_square(histograms, row_sums, queries, query_sums, rows=None):
+    """
+    (B, R) chi-square sums of B query histograms against rows of histograms (all of them,
+    or the given row indexes), in the histograms' stored units.
+
+    Uses (s - q)^2 / (s + q) = s + q - 4sq / (s + q): the first two terms sum to the
+    row and query totals, and the last one is zero wherever the query is, so each query
+    only reads the bins it actually uses. The rows are streamed in blocks and every
+    block is scored for all queries while it is in cache.
+    """
+    count = len(histograms) if rows is None else len(rows)
+    selected = [(bins, query[bins]) for query, bins in ((q, np.flatnonzero(q)) for q in queries)]
+
+    shared = np.empty((len(queries), count), dtype=np.float64)
+    step = max(1, MATCH_BLOCK // max(1, max(len(bins) for bins, _ in selected)))
+    for start in range(0, count, step):
+        if rows is None:
+            block = histograms[start:start + step]
+        else:
+            block = histograms[rows[start:start + step]]
+        for i, (bins, query) in enumerate(selected):
+            stored = np.take(block, bins, axis=1).astype(np.float32, copy=False)
+            terms = stored * query
+            stored += query
+            terms /= stored
+            shared[i, start:start + len(block)] = terms.sum(axis=1)
+
+    row_sums = row_sums if rows is None else row_sums[rows]
+    return row_sums[None, :] + query_sums[:, None] - 4.0 * shared
+
+
+def _cell_size(histograms):
+    # a bin holding a single pixel is 1 / cell_size; over a whole model one always exists
+    smallest = histograms[histograms > 0].min()
+    return int(round(1.0 / float(smallest)))
+
+
+# -----------------------------
+# MODEL
+# -----------------------------
+class LBPHModel:
+    """
+    LBPH model backed by numpy arrays. predict(face) -> (label, distance) like
+    cv2.face.LBPHFaceRecognizer, so it can be used wherever a recognizer is.
+    """
+
+    def __init__(self, histograms, labels, radius=1, neighbors=8, grid_x=8, grid_y=8,
+                 threshold=NO_DISTANCE, scale=1.0, source=None):
+        self.histograms = histograms
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.threshold = threshold
+        self.scale = scale
+        self.source = source
+        self._row_sums = None
+
+        if len(self.histograms) != len(self.labels):
+            raise ModelFormatError(f"{len(self.histograms)} histograms but {len(self.labels)} labels")
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def dtype(self):
+        return "uint16" if self.histograms.dtype == np.uint16 else "float32"
+
+    # -- building ----------------------------------------------------------
+    @classmethod
+    def from_recognizer(cls, recognizer, dtype="float32", source=None):
+        """Copy a trained cv2.face LBPH recognizer into numpy arrays."""
+        if dtype not in DTYPES:
+            raise ModelFormatError(f"unsupported histogram dtype {dtype!r} (use one of {DTYPES})")
+
+        rows = recognizer.getHistograms()
+        labels = np.asarray(recognizer.getLabels(), dtype=np.int32).ravel()
+        params = dict(radius=recognizer.getRadius(), neighbors=recognizer.getNeighbors(),
+                      grid_x=recognizer.getGridX(), grid_y=recognizer.getGridY())
+        dim = params["grid_x"] * params["grid_y"] * 2 ** params["neighbors"]
+
+        histograms = np.empty((len(rows), dim), dtype=np.float32)
+        for i, row in enumerate(rows):
+            histograms[i] = np.asarray(row, dtype=np.float32).ravel()
+
+        scale = 1.0
+        if dtype == "uint16" and len(rows):
+            # normalized histograms are count / cell_size; recover the counts
+            cell_size = _cell_size(histograms)
+            counts = histograms * np.float32(cell_size)
+            if cell_size > np.iinfo(np.uint16).max or np.abs(counts - np.rint(counts)).max() > 1e-3:
+                raise ModelFormatError("histograms are not bin counts / cell size, store them as float32")
+            histograms = np.rint(counts).astype(np.uint16)
+            scale = 1.0 / cell_size
+
+        return cls(histograms, labels, threshold=float(recognizer.getThreshold()),
+                   scale=scale, source=source, **params)
+
+    @classmethod
+    def from_yml(cls, model_path, dtype="float32"):
+        import cv2
+        if not hasattr(cv2, 'face'):
+            raise ModelFormatError("cv2.face module not found. Install 'opencv-contrib-python' not just 'opencv-python'.")
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        source = file_stamp(model_path)
+        recognizer.read(model_path)
+        return cls.from_recognizer(recognizer, dtype=dtype, source=source)
+
+    # -- storage -----------------------------------------------------------
+    def save(self, path, images=None):
+        """
+        Write the model into directory path. Every file is written under a temporary name
+        and os.replace()d; meta.json goes last and carries the row count, so a reader never
+        mixes a new histograms.npy with an old meta.json without noticing. images: {file
+        hash: label} of the images the model was trained with, if known.
+        """
+        os.makedirs(path, exist_ok=True)
+        publish(path, HISTOGRAMS_FILE, lambda f: np.save(f, np.ascontiguousarray(self.histograms)))
+        publish(path, LABELS_FILE, lambda f: np.save(f, self.labels))
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "radius": self.radius,
+            "neighbors": self.neighbors,
+            "grid_x": self.grid_x,
+            "grid_y": self.grid_y,
+            "threshold": self.threshold,
+            "dtype": self.dtype,
+            "scale": self.scale,
+            "count": len(self),
+            "source": self.source,
+            "yml_count": len(self),
+        }
+        if images is not None:
+            meta["images"] = {key: int(label) for key, label in images.items()}
+        write_meta(path, meta)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        meta = read_meta(path)
+        mode = "r" if mmap else None
+        histograms = np.load(os.path.join(path, HISTOGRAMS_FILE), mmap_mode=mode)
+        labels = np.load(os.path.join(path, LABELS_FILE))
+        if len(histograms) != meta["count"] or histograms.dtype != np.dtype(meta["dtype"]):
+            raise ModelFormatError(f"{path} is incomplete (being written?)")
+
+        return cls(histograms, labels, radius=meta["radius"], neighbors=meta["neighbors"],
+                   grid_x=meta["grid_x"], grid_y=meta["grid_y"], threshold=meta["threshold"],
+                   scale=meta["scale"], source=meta.get("source"))
+
+    # -- recognition -------------------------------------------------------
+    def histogram(self, face):
+        return spatial_histogram(face, self.radius, self.neighbors, self.grid_x, self.grid_y)
+
+    def row_sums(self):
+        if self._row_sums is None:
+            self._row_sums = np.asarray(self.histograms.sum(axis=1, dtype=np.float64))
+        return self._row_sums
+
+    def distances(self, face):
+        """Distance of a face to every stored histogram."""
+        return self.distances_batch([face])[0]
+
+    def queries(self, faces):
+        """Histograms of equally sized faces in stored units, and their sums."""
+        queries = self.histogram(np.stack([np.asarray(face) for face in faces]))
+        queries = (queries / np.float32(self.scale)).astype(np.float32)
+        return queries, queries.sum(axis=1, dtype=np.float64)
+
+    def distances_batch(self, faces):
+        """(B, N) distances of B equally sized faces to every stored histogram."""
+        queries, query_sums = self.queries(faces)
+        return 2.0 * self.scale * chi_square(self.histograms, self.row_sums(), queries, query_sums)
+
+    def best(self, distances, rows=None):
+        """(label, distance) of the closest histogram; distances may cover only the given rows."""
+        best = int(np.argmin(distances))
+        if distances[best] >= self.threshold:
+            return NO_LABEL, NO_DISTANCE
+        row = best if rows is None else int(rows[best])
+        return int(self.labels[row]), float(distances[best])
+
+    def predict(self, face):
+        if not len(self):
+            return NO_LABEL, NO_DISTANCE
+        return self.best(self.distances(face))
+
+    def subset(self, labels):
+        return GallerySubset(self, labels)
+
+    def predict_batch(self, faces):
+        """predict() for several faces (same size) at once -> [(label, distance)]."""
+        if not len(faces):
+            return []
+        if not len(self):
+            return [(NO_LABEL, NO_DISTANCE)] * len(faces)
+        return [self.best(distances) for distances in self.distances_batch(faces)]
+
+
+def read_meta(path):
+    meta_path = os.path.join(path, META_FILE)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as exc:
+        raise ModelFormatError(f"unreadable model metadata {meta_path}: {exc}")
+
+    if meta.get("version") != FORMAT_VERSION:
+        raise ModelFormatError(f"unsupported binary model version {meta.get('version')!r} in {path}")
+    return meta
+
+
+def write_meta(path, meta):
+    publish(path, META_FILE, lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+
+
+_NPY_HEADERS = {
+    (1, 0): (np.lib.format.read_array_header_1_0, np.lib.format.write_array_header_1_0),
+    (2, 0): (np.lib.format.read_array_header_2_0, np.lib.format.write_array_header_2_0),
+}
+
+
+def _append_npy(path, rows, count):
+    """
+    Write rows into the .npy array at path after its first count rows, in place, and
+    rewrite the header for the new length. False (nothing written) when the header can't
+    be rewritten at the same size, e.g. a file saved by a numpy without growth padding.
+    """
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version not in _NPY_HEADERS:
+            return False
+        read_header, write_header = _NPY_HEADERS[version]
+        shape, fortran, dtype = read_header(f)
+        offset = f.tell()
+        if fortran or dtype != rows.dtype or shape[1:] != rows.shape[1:] or shape[0] < count:
+            raise ModelFormatError(f"{path} doesn't match the rows to append")
+
+        header = io.BytesIO()
+        write_header(header, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False,
+                              "shape": (count + len(rows),) + shape[1:]})
+        if header.tell() != offset:
+            return False
+
+        # rows past count are left over from an interrupted append: overwrite them
+        f.seek(offset + count * int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize)
+        f.truncate()
+        f.write(rows.tobytes())
+        f.flush()
+        f.seek(0)
+        f.write(header.getvalue())
+    return True
+
+
+def append(path, histograms, labels, images=None):
+    """
+    Append rows (histograms in stored units, see LBPHModel.queries) to the binary model
+    in directory path, and images ({file hash: label}) to those it holds. Only the new
+    rows are written, so the cost doesn't depend on the model size; meta.json goes last,
+    as in save(). Returns the new row count.
+    """
+    meta = read_meta(path)
+    count = meta["count"]
+    labels = np.asarray(labels, dtype=np.int32).ravel()
+    histograms = np.asarray(histograms, dtype=np.float32)
+    if meta["dtype"] == "uint16":
+        histograms = np.rint(histograms)
+    histograms = np.ascontiguousarray(histograms.astype(meta["dtype"]))
+    if len(histograms) != len(labels):
+        raise ModelFormatError(f"{len(histograms)} histograms but {len(labels)} labels")
+
+    for name, rows in ((HISTOGRAMS_FILE, histograms), (LABELS_FILE, labels)):
+        if not _append_npy(os.path.join(path, name), rows, count):
+            # no room to grow the header: rewrite the file once (np.save pads it for next time)
+            stored = np.load(os.path.join(path, name), mmap_mode="r")[:count]
+            publish(path, name, lambda f: np.save(f, np.concatenate([stored, rows])))
+
+    meta["count"] = count + len(labels)
+    meta.setdefault("yml_count", count)
+    meta.setdefault("images", {}).update((key, int(label)) for key, label in (images or {}).items())
+    write_meta(path, meta)
+    return meta["count"]
+
+
+class GallerySubset:
+    """
+    View of an LBPHModel restricted to some labels (e.g. the students of one section).
+    predict() / predict_batch() only look at those labels' histograms; nothing is copied.
+    """
+
+    def __init__(self, model, labels):
+        self.model = model
+        self.allowed = frozenset(int(label) for label in labels)
+        self.rows = np.flatnonzero(np.isin(model.labels, sorted(self.allowed)))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def predict_batch(self, faces):
+        if not len(faces):
+            return []
+        if not len(self):
+            return [(NO_LABEL, NO_DISTANCE)] * len(faces)
+
+        model = self.model
+        queries, query_sums = model.queries(faces)
+        distances = chi_square(model.histograms, model.row_sums(), queries, query_sums, self.rows)
+        return [model.best(row, self.rows) for row in 2.0 * model.scale * distances]
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+
+def _positive(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None  # also drops NaN
+
+
+class Thresholds:
+    """
+    Acceptance thresholds from threshold.json as written by train.py: a global
+    "threshold" plus "per_class" values (a bare number is accepted too). A missing or
+    unusable file gives the default: a non-positive threshold would reject every face.
+    """
+
+    def __init__(self, threshold, per_class=None):
+        self.threshold = threshold
+        self.per_class = {int(k): float(v) for k, v in (per_class or {}).items()}
+
+    @classmethod
+    def load(cls, path, default):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(default)
+        if isinstance(data, dict) and "per_class" in data:
+            threshold, per_class = _positive(data.get("threshold")), data["per_class"]
+        elif isinstance(data, (int, float)):
+            threshold, per_class = _positive(data), None
+        else:
+            # the old {"mean", "std", "threshold"} format was computed on the training
+            # images themselves (distances of ~0), it doesn't separate anything
+            threshold, per_class = None, None
+        if threshold is None:
+            return cls(default)
+        per_class = {k: _positive(v) for k, v in (per_class or {}).items()} if isinstance(per_class, dict) else {}
+        return cls(threshold, {k: v for k, v in per_class.items() if v is not None})
+
+    def accepts(self, label, distance):
+        # LBPH: lower distance = better match
+        return label != NO_LABEL and distance <= self.per_class.get(label, self.threshold)
+
+
+# -----------------------------
+# LOADING FOR THE RECOGNIZERS
+# -----------------------------
+def is_current(model_path):
+    """True when the binary model next to model_path exists and was written from this .yml."""
+    meta_path = os.path.join(binary_path(model_path), META_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    if not os.path.exists(model_path):
+        return True
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            source = json.load(f).get("source")
+        return source == file_stamp(model_path)
+    except (OSError, ValueError):
+        return False
+
+
+def pending_rows(model_path):
+    """Rows appended to the binary model (enrollments) that the .yml doesn't hold yet."""
+    try:
+        meta = read_meta(binary_path(model_path))
+    except ModelFormatError:
+        return 0
+    return meta["count"] - meta.get("yml_count", meta["count"])
+
+
+def mark_stale(model_path):
+    """Flag the .yml as missing the binary model's pending rows (cleared by sync_yml / a new .yml)."""
+    publish(os.path.dirname(os.path.abspath(model_path)), os.path.basename(model_path) + STALE_SUFFIX,
+            lambda f: f.write(json.dumps({"pending_rows": pending_rows(model_path)}).encode("utf-8")))
+
+
+def clear_stale(model_path):
+    try:
+        os.remove(model_path + STALE_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def load_recognizer(model_path):
+    """
+    Fast loader: the binary model if it is current, else the .yml through OpenCV.
+    Either way the result has predict(face) -> (label, distance).
+    """
+    if is_current(model_path):
+        try:
+            return LBPHModel.load(binary_path(model_path))
+        except (OSError, ModelFormatError) as exc:
+            print(f"[lbph] binary model unusable, reading {model_path}: {exc}")
+    if os.path.exists(model_path + STALE_SUFFIX):
+        print(f"[lbph] WARNING: {model_path} misses the samples enrolled since it was written; "
+              "retrain, or restore its binary model and run --to-yml")
+
+    import cv2
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    return recognizer
+
+
+# -----------------------------
+# CONVERTER
+# -----------------------------
+def convert(model_path, out_dir=None, dtype="float32"):
+    model = LBPHModel.from_yml(model_path, dtype=dtype)
+    out_dir = out_dir or binary_path(model_path)
+    model.save(out_dir)
+    return model, out_dir
+
+
+def write_yml(model, path):
+    """Save an LBPHModel as an OpenCV LBPH .yml, as recognizer.save() would."""
+    import cv2
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+    fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+    fs.write("threshold", float(model.threshold))
+    for name in ("radius", "neighbors", "grid_x", "grid_y"):
+        fs.write(name, int(getattr(model, name)))
+    fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+    scale = np.float64(model.scale)
+    for row in model.histograms:
+        # uint16 rows hold bin counts: back to OpenCV's normalized float32 histograms
+        fs.write("", (row * scale).astype(np.float32).reshape(1, -1))
+    fs.endWriteStruct()
+    fs.write("labels", model.labels.reshape(-1, 1))
+    fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+    fs.endWriteStruct()
+    fs.endWriteStruct()
+    fs.release()
+
+
+def sync_yml(model_path):
+    """
+    Rewrite the .yml from its binary model (after enrollments). As in train.save_model
+    the binary model is restamped first and the .yml os.replace()d last.
+    """
+    directory = binary_path(model_path)
+    model = LBPHModel.load(directory)
+    tmp_model = os.path.splitext(model_path)[0] + ".tmp.yml"
+    write_yml(model, tmp_model)
+
+    meta = read_meta(directory)
+    meta.update(source=file_stamp(tmp_model), yml_count=meta["count"])
+    write_meta(directory, meta)
+    os.replace(tmp_model, model_path)
+    clear_stale(model_path)
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert an OpenCV LBPH .yml model to the binary format.")
+    parser.add_argument("model", help="LBPH model saved by recognizer.save() (e.g. models/face_recognizer.yml)")
+    parser.add_argument("--out", default=None, help="output directory (default: <model>.lbph next to the .yml)")
+    parser.add_argument("--dtype", choices=DTYPES, default="float32",
+                        help="histogram storage; uint16 keeps bin counts and halves the size")
+    parser.add_argument("--to-yml", action="store_true",
+                        help="the other way: rewrite the .yml from its binary model (after train.py --enroll)")
+    args = parser.parse_args(argv)
+
+    if args.to_yml:
+        if not is_current(args.model):
+            print("[lbph] ERROR: no binary model written from", args.model)
+            return 1
+        pending = pending_rows(args.model)
+        model = sync_yml(args.model)
+        print(f"[lbph] wrote {len(model)} histograms ({pending} enrolled since the last .yml) to {args.model}")
+        return 0
+
+    if not os.path.exists(args.model):
+        print("[lbph] ERROR: model not found:", args.model)
+        return 1
+
+    model, out_dir = convert(args.model, args.out, args.dtype)
+    size = sum(os.path.getsize(os.path.join(out_dir, name)) for name in (HISTOGRAMS_FILE, LABELS_FILE, META_FILE))
+    print(f"[lbph] wrote {len(model)} histograms ({model.dtype}) to {out_dir}: "
+          f"{size / 1e6:.1f} MB vs {os.path.getsize(args.model) / 1e6:.1f} MB yml")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import os
+import csv
+import json
+import time
+import queue
+import threading
+
+# Asynchronous attendance log.
+#
+# write() only enqueues the event; a background thread appends events to the log file in
+# batches, flushing every FLUSH_INTERVAL seconds or FLUSH_COUNT events, whichever comes
+# first. close() drains the queue and joins the writer, so nothing is lost on session stop.
+# BatchWriter is the same machinery with the flush supplied by the caller (e.g. database
+# inserts, see api/views.py).
+
+FLUSH_INTERVAL = 1.0  # seconds
+FLUSH_COUNT = 50      # events
+CSV_HEADER = ["Name", "Time"]
+
+
+class BatchWriter:
+    """Attendance events handed to flush(batch) (a list of event dicts) on a background thread."""
+
+    def __init__(self, flush=None, flush_interval=FLUSH_INTERVAL, flush_count=FLUSH_COUNT, name="batch-writer"):
+        self.flush = flush
+        self.flush_interval = flush_interval
+        self.flush_count = flush_count
+
+        self.written = 0
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def write(self, name, timestamp, **extra):
+        """Queue one attendance event; never writes on the caller's thread."""
+        if self._closed.is_set():
+            raise RuntimeError("attendance log is closed")
+        self._queue.put(dict(name=name, time=timestamp, **extra))
+
+    def close(self, timeout=5.0):
+        self._closed.set()
+        self._queue.put(None)  # wake the writer
+        self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        batch = []
+        deadline = None
+
+        while True:
+            timeout = self.flush_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                event = self._queue.get(timeout=timeout)
+                if event is not None:
+                    batch.append(event)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            if batch and (len(batch) >= self.flush_count or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+            if self._closed.is_set() and self._queue.empty():
+                break
+
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            self.flush(batch)
+            self.written += len(batch)
+        except Exception as exc:
+            print(f"[log] could not write {len(batch)} attendance events: {exc}")
+
+
+class AttendanceLogWriter(BatchWriter):
+    """
+    Batched attendance log in CSV ("Name,Time", the historical format) or JSON Lines.
+
+    fmt is "csv" or "jsonl"; by default it follows the file extension.
+    """
+
+    def __init__(self, path, fmt=None, flush_interval=FLUSH_INTERVAL, flush_count=FLUSH_COUNT):
+        self.path = path
+        self.fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        if self.fmt not in ("csv", "jsonl"):
+            raise ValueError(f"unsupported attendance log format: {self.fmt}")
+        super().__init__(flush_interval=flush_interval, flush_count=flush_count, name="attendance-log")
+
+    def _flush(self, batch):
+        try:
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                if self.fmt == "csv":
+                    writer = csv.writer(f)
+                    if new_file:
+                        writer.writerow(CSV_HEADER)
+                    writer.writerows([event["name"], event["time"]] for event in batch)
+                else:
+                    f.writelines(json.dumps(event) + "\n" for event in batch)
+            self.written += len(batch)
+        except OSError as exc:
+            print(f"[log] could not write {len(batch)} attendance events to {self.path}: {exc}")
@@ -0,0 +1,323 @@
+import cv2
+import json
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    from . import lbph_model
+    from . import embedding_backend
+    from . import embedding_store
+    from . import face_detectors
+    from .lbph_index import PrototypeIndex
+except ImportError:
+    import lbph_model
+    import embedding_backend
+    import embedding_store
+    import face_detectors
+    from lbph_index import PrototypeIndex
+
+# Process-wide model registry.
+#
+# The LBPH model and labels are loaded once and shared read-only by every detector
+# worker (LBPH predict doesn't modify the model, so concurrent predicts are safe).
+# get() re-checks the model file at most every CHECK_INTERVAL seconds; when training
+# replaced it, the new version is loaded on a background thread and swapped in with a
+# single reference assignment, so callers never see a half-loaded model.
+# Haar cascades are *not* thread-safe, so they are handed out from a pool instead; the
+# same goes for the face detectors of face_detectors.py (detector()).
+# The binary model written next to the .yml (see lbph_model.py) is preferred when current.
+# RECOGNIZER_BACKEND = "embedding" swaps LBPH for the ONNX embedding gallery
+# (embedding_backend.py, stored in embedding_store.py); it is hot-swapped the same way when
+# students are added to or removed from the gallery.
+# The acceptance thresholds calibrated by train.py (threshold.json) belong to the model
+# they were measured on: they are loaded and swapped together with it, FaceModel.accepts().
+
+# Prefer repository-local paths. Keep them relative so this project works across machines.
+REPO_ROOT = os.path.dirname(__file__)
+MODEL_PATH = os.path.join(REPO_ROOT, "models", "face_recognizer.yml")
+LABELS_PATH = os.path.join(REPO_ROOT, "models", "labels.json")
+THRESHOLD_PATH = os.path.join(REPO_ROOT, "models", "threshold.json")
+DEFAULT_THRESHOLD = 90.0  # LBPH distance accepted without threshold.json (lower = stricter)
+CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+CHECK_INTERVAL = 5.0  # seconds between model file checks
+PROTOTYPE_TOP_K = None  # e.g. 10: two-stage search (lbph_index.py) for large galleries; None = exact
+RECOGNIZER_BACKEND = os.environ.get("CAVS_RECOGNIZER", "lbph")  # "lbph" or "embedding"
+BACKENDS = ("lbph", "embedding")
+
+
+class ModelError(RuntimeError):
+    pass
+
+
+def student_code(name):
+    # label names are dataset folders, "First_Last_35400": they end in the student code
+    return name[-5:]
+
+
+class FaceModel:
+    """
+    One immutable model version: recognizer (LBPH or embedding) + {label id: name} +
+    the lbph_model.Thresholds its matches are accepted under.
+    """
+
+    def __init__(self, recognizer, labels, version, thresholds=None):
+        self.recognizer = recognizer
+        self.labels = labels
+        self.version = version
+        self.thresholds = thresholds or lbph_model.Thresholds(DEFAULT_THRESHOLD)
+        self.loaded_at = time.time()
+        self._lbph = None
+        self._lock = threading.Lock()
+
+    def predict(self, face):
+        return self.recognizer.predict(face)
+
+    def predict_batch(self, faces):
+        """[(label, distance)] for equally sized faces; one matching pass with the binary model."""
+        if hasattr(self.recognizer, "predict_batch"):
+            return self.recognizer.predict_batch(faces)
+        return [self.recognizer.predict(face) for face in faces]
+
+    def name(self, label, default="Unknown"):
+        return self.labels.get(label, default)
+
+    def accepts(self, label, distance):
+        """True when a (label, distance) prediction is a match: a known label under its threshold."""
+        return label in self.labels and self.thresholds.accepts(label, distance)
+
+    def lbph(self):
+        """The model as an LBPHModel (converted once from an OpenCV recognizer if needed)."""
+        with self._lock:
+            if self._lbph is None:
+                recognizer = self.recognizer
+                if isinstance(recognizer, PrototypeIndex):
+                    recognizer = recognizer.model
+                if not isinstance(recognizer, lbph_model.LBPHModel):
+                    recognizer = lbph_model.LBPHModel.from_recognizer(recognizer)
+                self._lbph = recognizer
+            return self._lbph
+
+    def restrict(self, codes):
+        """
+        This model restricted to the given student codes (e.g. one section's students):
+        faces are only matched against their samples. Same labels and version.
+        """
+        codes = set(codes)
+        label_ids = [label for label, name in self.labels.items() if student_code(name) in codes]
+        if isinstance(self.recognizer, embedding_backend.EmbeddingRecognizer):
+            return FaceModel(self.recognizer.subset(label_ids), self.labels, self.version, self.thresholds)
+        return FaceModel(self.lbph().subset(label_ids), self.labels, self.version, self.thresholds)
+
+
+def _file_version(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _optional_version(path):
+    try:
+        return _file_version(path)
+    except OSError:
+        return None
+
+
+def _model_version(model_path):
+    # train.py replaces the .yml last, an enrollment only republishes the binary model's
+    # meta.json (lbph_model.append); a model shipped only in binary form has no .yml
+    meta_path = os.path.join(lbph_model.binary_path(model_path), lbph_model.META_FILE)
+    if os.path.exists(model_path):
+        return (_file_version(model_path), _optional_version(meta_path))
+    return (None, _file_version(meta_path))
+
+
+def _gallery_version(gallery_path, embedding_model_path):
+    # the store republishes ids.json after every change; a new ONNX model also needs a reload
+    return (_file_version(os.path.join(gallery_path, embedding_store.IDS_FILE)),
+            _file_version(embedding_model_path))
+
+
+class ModelRegistry:
+
+    def __init__(self, model_path=MODEL_PATH, labels_path=LABELS_PATH, threshold_path=THRESHOLD_PATH,
+                 cascade_path=CASCADE_PATH, check_interval=CHECK_INTERVAL, top_k=PROTOTYPE_TOP_K,
+                 backend=RECOGNIZER_BACKEND, gallery_path=embedding_store.STORE_PATH,
+                 embedding_model_path=embedding_backend.ONNX_MODEL_PATH,
+                 detector_backend=face_detectors.DETECTOR_BACKEND, detector_confidence=face_detectors.CONFIDENCE):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown recognizer backend {backend!r} (expected one of {BACKENDS})")
+        self.backend = backend
+        self.gallery_path = gallery_path
+        self.embedding_model_path = embedding_model_path
+        self.model_path = model_path
+        self.labels_path = labels_path
+        self.threshold_path = threshold_path
+        self.cascade_path = cascade_path
+        self.check_interval = check_interval
+        self.top_k = top_k
+        self.detector_backend = detector_backend
+        self.detector_confidence = detector_confidence
+
+        self._model = None
+        self._last_check = 0.0
+        self._reloading = False
+        self._lock = threading.Lock()
+        self._cascades = []
+        self._detectors = {}
+
+    # -----------------------------
+    # MODEL
+    # -----------------------------
+    def load(self):
+        """Read model + labels from disk. Raises ModelError with a helpful message."""
+        # Validate model and label files exist and give helpful errors
+        if not os.path.exists(self.labels_path):
+            raise ModelError(f"labels file not found at {self.labels_path} "
+                             "(create './models/labels.json' or run train.py)")
+
+        if self.backend == "embedding":
+            return self._load_embedding()
+
+        # Ensure OpenCV face module is available (needs opencv-contrib-python)
+        if not hasattr(cv2, 'face'):
+            raise ModelError("cv2.face module not found. Install 'opencv-contrib-python' not just 'opencv-python'.")
+
+        if not os.path.exists(self.model_path) and not lbph_model.is_current(self.model_path):
+            raise ModelError(f"model file not found at {self.model_path} "
+                             "(train a recognizer or copy a trained model to './models/face_recognizer.yml')")
+
+        # version first: if training replaces the file while we read, the next check reloads
+        version = self._version()
+
+        labels = self._read_labels()
+        thresholds = lbph_model.Thresholds.load(self.threshold_path, DEFAULT_THRESHOLD)
+
+        try:
+            recognizer = lbph_model.load_recognizer(self.model_path)
+        except Exception as exc:
+            raise ModelError(f"could not read model: {exc}")
+
+        if self.top_k and isinstance(recognizer, lbph_model.LBPHModel):
+            # prototypes are built here, i.e. on the reload thread for hot-swaps
+            recognizer = PrototypeIndex(recognizer, top_k=self.top_k)
+
+        return FaceModel(recognizer, labels, version, thresholds)
+
+    def _load_embedding(self):
+        try:
+            version = _gallery_version(self.gallery_path, self.embedding_model_path)
+        except OSError:
+            raise ModelError(f"embedding gallery or model missing ({self.gallery_path}, {self.embedding_model_path}); "
+                             "run embedding_backend.py")
+
+        labels = self._read_labels()
+        codes = {student_code(name): label for label, name in labels.items()}
+        try:
+            recognizer = embedding_backend.EmbeddingRecognizer.load(codes, self.gallery_path, self.embedding_model_path)
+        except embedding_backend.EmbeddingError as exc:
+            raise ModelError(str(exc))
+        # threshold.json holds LBPH distances; the gallery applies its own similarity threshold
+        return FaceModel(recognizer, labels, version, lbph_model.Thresholds(1.0 - recognizer.threshold))
+
+    def _read_labels(self):
+        with open(self.labels_path, "r") as f:
+            # Reverse dictionary {id: name}
+            return {int(k): v for k, v in json.load(f).items()}
+
+    def _version(self):
+        if self.backend == "embedding":
+            return _gallery_version(self.gallery_path, self.embedding_model_path)
+        # threshold.json is optional: without it the model runs on DEFAULT_THRESHOLD
+        return (_model_version(self.model_path), _optional_version(self.threshold_path))
+
+    def get(self):
+        """Current model; the first call loads it, later calls trigger background hot-swaps."""
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.load()
+                    self._last_check = time.monotonic()
+                    print(f"[registry] model loaded ({len(self._model.labels)} labels)")
+                return self._model
+
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._check_for_update(now)
+        return model
+
+    def _check_for_update(self, now):
+        with self._lock:
+            if self._reloading or now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            try:
+                changed = self._version() != self._model.version
+            except OSError:
+                return  # being replaced right now; check again later
+            if not changed:
+                return
+            self._reloading = True
+
+        threading.Thread(target=self._reload, name="model-reload", daemon=True).start()
+
+    def _reload(self):
+        try:
+            model = self.load()
+            self._model = model  # atomic swap
+            print(f"[registry] hot-swapped to new model ({len(model.labels)} labels)")
+        except ModelError as exc:
+            print(f"[registry] keeping current model, reload failed: {exc}")
+        finally:
+            self._reloading = False
+
+    def preload(self):
+        """Load the model on a background thread so the first session doesn't wait for it."""
+        def run():
+            try:
+                self.get()
+            except ModelError as exc:
+                print(f"[registry] preload failed: {exc}")
+        threading.Thread(target=run, name="model-preload", daemon=True).start()
+
+    # -----------------------------
+    # HAAR CASCADES
+    # -----------------------------
+    @contextmanager
+    def cascade(self):
+        """Borrow a parsed Haar cascade for the duration of a with-block (one thread at a time)."""
+        with self._lock:
+            cascade = self._cascades.pop() if self._cascades else None
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+        try:
+            yield cascade
+        finally:
+            with self._lock:
+                self._cascades.append(cascade)
+
+    @contextmanager
+    def detector(self, backend=None):
+        """
+        Borrow a face detector (face_detectors.py) of the given backend, by default the
+        configured one. Raises face_detectors.DetectorError when its model files are missing.
+        """
+        backend = backend or self.detector_backend
+        with self._lock:
+            pool = self._detectors.setdefault(backend, [])
+            detector = pool.pop() if pool else None
+        if detector is None:
+            detector = face_detectors.create_detector(backend, self.detector_confidence, self.cascade_path)
+        try:
+            yield detector
+        finally:
+            with self._lock:
+                pool.append(detector)
+
+
+registry = ModelRegistry()
+
+
+def get_model():
+    return registry.get()
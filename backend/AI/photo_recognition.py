@@ -0,0 +1,109 @@
+import time
+import threading
+import numpy as np
+import cv2
+
+try:
+    from .model_registry import registry, student_code
+    from .tiled_detection import TiledDetector, TILE_SIZE, MAX_FACES
+    from .face_preprocess import prepare_face
+except ImportError:
+    from model_registry import registry, student_code
+    from tiled_detection import TiledDetector, TILE_SIZE, MAX_FACES
+    from face_preprocess import prepare_face
+
+# Recognition of uploaded group photos (POST /api/sessions/{id}/capture/).
+#
+# Photos arrive as encoded bytes and are decoded in memory. Faces are found with the
+# registry's detector backend: fixed-input DNN detectors (SSD, ONNX) are run tiled
+# (tiled_detection.py) so the back rows of a 1920x1080 photo aren't lost, the Haar cascade
+# already scans every scale of the full photo in one pass. All faces of a photo are then
+# matched in one predict_batch() against the given students only (the session's section).
+#
+# Every face gets the recognizer's "confidence" as recognize.py uses it: the LBPH (or
+# embedding) distance, lower = better, accepted under the model's thresholds. A student
+# matched by several faces keeps the best one; the others count as unidentified.
+
+TILED_BACKENDS = ("ssd", "onnx")  # detectors that lose small faces on a downscaled photo
+
+_tiled = None
+_tiled_lock = threading.Lock()
+
+
+class PhotoError(ValueError):
+    pass
+
+
+def decode_image(data):
+    """Encoded JPEG / PNG bytes -> BGR image, without touching the disk."""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise PhotoError("not a readable image")
+    return image
+
+
+def _tiled_detector():
+    global _tiled
+    with _tiled_lock:
+        if _tiled is None:
+            _tiled = TiledDetector()
+        return _tiled
+
+
+def detect_faces(image):
+    """(x, y, w, h) boxes of the faces in a BGR photo, at most MAX_FACES (largest first)."""
+    height, width = image.shape[:2]
+    if registry.detector_backend in TILED_BACKENDS and max(height, width) > TILE_SIZE:
+        return _tiled_detector().detect(image).boxes
+
+    with registry.detector() as detector:
+        boxes = detector(image)
+    boxes = sorted(boxes, key=lambda box: box[2] * box[3], reverse=True)
+    return boxes[:MAX_FACES] if MAX_FACES else boxes
+
+
+def recognize_photos(images, students=None):
+    """
+    Detect and recognize the faces of decoded photos.
+
+    students restricts matching to these student codes (None = everybody in the model).
+    Returns {"matches": [...], "unidentified": [...], "faces": n, "seconds": s}; a match is
+    {"student_code", "name", "confidence", "face_box", "image"} with image the index of
+    the photo it was found in. Raises model_registry.ModelError /
+    face_detectors.DetectorError when no model or detector is available.
+    """
+    start = time.perf_counter()
+    model = registry.get()
+    scoped = model.restrict(students) if students is not None else model
+
+    faces = []
+    for index, image in enumerate(images):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        for (x, y, w, h) in detect_faces(image):
+            faces.append((index, (int(x), int(y), int(w), int(h)), prepare_face(gray, (x, y, w, h))))
+
+    predictions = scoped.predict_batch([crop for _, _, crop in faces]) if faces else []
+
+    best = {}
+    unidentified = []
+    for (index, box, _), (label, confidence) in zip(faces, predictions):
+        if not model.accepts(label, confidence):
+            unidentified.append({"face_box": list(box), "image": index})
+            continue
+        name = model.name(label)
+        match = {"student_code": student_code(name), "name": name, "confidence": round(float(confidence), 2),
+                 "face_box": list(box), "image": index}
+        previous = best.get(match["student_code"])
+        if previous is None or confidence < previous["confidence"]:
+            if previous is not None:
+                unidentified.append({"face_box": previous["face_box"], "image": previous["image"]})
+            best[match["student_code"]] = match
+        else:
+            unidentified.append({"face_box": list(box), "image": index})
+
+    return {
+        "matches": sorted(best.values(), key=lambda m: m["confidence"]),
+        "unidentified": unidentified,
+        "faces": len(faces),
+        "seconds": time.perf_counter() - start,
+    }
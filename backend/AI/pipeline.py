@@ -0,0 +1,255 @@
+import cv2
+import time
+import threading
+from collections import deque
+
+# Staged live-recognition pipeline:
+#
+#   camera -> [capture thread] -> frames -> [detection worker] -> detections -> [recognition pool] -> results
+#
+# Stages are connected by bounded drop-oldest queues, so a slow stage sheds stale work
+# instead of back-pressuring the camera; throughput is set by the slowest stage rather
+# than by the sum of all stages.
+
+REPORT_INTERVAL = 5.0  # seconds between "[pipeline]" stats lines (0 = never)
+
+
+class DropOldestQueue:
+    """Bounded FIFO; put() never blocks, it evicts the oldest item when full."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None if nothing arrived within timeout."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+
+class StageStats:
+    """Thread-safe processed-item counter with a sliding-window FPS."""
+
+    def __init__(self, name, window=2.0):
+        self.name = name
+        self.window = window
+        self.count = 0
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.perf_counter()
+        with self._lock:
+            self.count += 1
+            self._times.append(now)
+            while self._times and now - self._times[0] > self.window:
+                self._times.popleft()
+
+    def fps(self):
+        now = time.perf_counter()
+        with self._lock:
+            while self._times and now - self._times[0] > self.window:
+                self._times.popleft()
+            return len(self._times) / self.window
+
+
+class Detection:
+    def __init__(self, frame_id, frame, gray, boxes):
+        self.frame_id = frame_id
+        self.frame = frame
+        self.gray = gray
+        self.boxes = boxes
+        self.tracks = None  # [(track, needs_recognition)] per box when a tracker is used
+        self.faces = []     # [(box, label, distance)] filled in by the recognition stage
+
+
+class RecognitionPipeline:
+    """
+    Run capture, detection and recognition concurrently.
+
+    detect_fn(gray) -> list of (x, y, w, h) boxes; called from the single detection thread.
+    recognize_fn(gray, boxes) -> list of (label, distance), one per box; called from
+    `recognize_workers` threads, so it must only read shared state.
+    Finished frames are returned by get(); results can arrive slightly out of order when
+    several recognition workers are used (compare frame_id if that matters).
+
+    With a tracking.FaceTracker, only faces the tracker schedules are passed to
+    recognize_fn; every face is reported with its track's voted label / distance.
+    """
+
+    def __init__(self, cap, detect_fn, recognize_fn, stop_event, tracker=None,
+                 recognize_workers=2, queue_size=2, report_interval=REPORT_INTERVAL):
+        self.cap = cap
+        self.detect_fn = detect_fn
+        self.recognize_fn = recognize_fn
+        self.stop_event = stop_event
+        self.tracker = tracker
+        self.report_interval = report_interval
+        self.failed = False
+
+        self.faces_seen = 0
+        self.faces_predicted = 0
+        self._count_lock = threading.Lock()
+
+        # capture only ever needs the newest frame
+        self.frames = DropOldestQueue(1)
+        self.detections = DropOldestQueue(queue_size)
+        self.results = DropOldestQueue(queue_size)
+
+        self.stats = {name: StageStats(name) for name in ("capture", "detect", "recognize")}
+
+        self._done = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="pipeline-capture", daemon=True),
+            threading.Thread(target=self._detect_loop, name="pipeline-detect", daemon=True),
+        ]
+        self._threads += [
+            threading.Thread(target=self._recognize_loop, name=f"pipeline-recognize-{i}", daemon=True)
+            for i in range(recognize_workers)
+        ]
+        self._last_report = time.perf_counter()
+
+    # -----------------------------
+    # LIFECYCLE
+    # -----------------------------
+    def start(self):
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._done.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def running(self):
+        return not (self._done.is_set() or self.stop_event.is_set())
+
+    def get(self, timeout=0.5):
+        """Next recognized frame (a Detection), or None on timeout."""
+        result = self.results.get(timeout)
+        self._maybe_report()
+        return result
+
+    # -----------------------------
+    # STAGES
+    # -----------------------------
+    def _capture_loop(self):
+        frame_id = 0
+        while self.running():
+            ret, frame = self.cap.read()
+            if not ret:
+                self.failed = True
+                self._done.set()
+                break
+            frame_id += 1
+            self.frames.put((frame_id, frame))
+            self.stats["capture"].tick()
+
+    def _detect_loop(self):
+        while self.running():
+            item = self.frames.get(timeout=0.1)
+            if item is None:
+                continue
+            frame_id, frame = item
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            boxes = self.detect_fn(gray)
+            detection = Detection(frame_id, frame, gray, boxes)
+            if self.tracker is not None:
+                # tracker state must advance in frame order, so it runs on this thread
+                detection.tracks = self.tracker.update(boxes)
+            self.detections.put(detection)
+            self.stats["detect"].tick()
+
+    def _recognize_loop(self):
+        while self.running():
+            detection = self.detections.get(timeout=0.1)
+            if detection is None:
+                continue
+            if len(detection.boxes):
+                self._recognize(detection)
+            self.results.put(detection)
+            self.stats["recognize"].tick()
+
+    def _recognize(self, detection):
+        boxes = [tuple(int(v) for v in box) for box in detection.boxes]
+
+        if self.tracker is None:
+            predictions = self.recognize_fn(detection.gray, boxes)
+            detection.faces = [(box, label, distance) for box, (label, distance) in zip(boxes, predictions)]
+            predicted = len(boxes)
+        else:
+            due = [i for i, (_, needs_recognition) in enumerate(detection.tracks) if needs_recognition]
+            if due:
+                predictions = self.recognize_fn(detection.gray, [boxes[i] for i in due])
+                for i, (label, distance) in zip(due, predictions):
+                    self.tracker.observe(detection.tracks[i][0], label, distance)
+            detection.faces = [(box, track.label, track.distance)
+                               for box, (track, _) in zip(boxes, detection.tracks)]
+            predicted = len(due)
+
+        with self._count_lock:
+            self.faces_seen += len(boxes)
+            self.faces_predicted += predicted
+
+    # -----------------------------
+    # REPORTING
+    # -----------------------------
+    def report(self):
+        fps = " ".join(f"{name}={s.fps():.1f}fps" for name, s in self.stats.items())
+        return (f"{fps} | predicted {self.faces_predicted}/{self.faces_seen} faces | queue frames={self.frames.qsize()}/{self.frames.maxsize} "
+                f"detections={self.detections.qsize()}/{self.detections.maxsize} "
+                f"results={self.results.qsize()}/{self.results.maxsize} | "
+                f"dropped frames={self.frames.dropped} detections={self.detections.dropped} "
+                f"results={self.results.dropped}"
+                + (f" | {self.detect_fn.report()}" if hasattr(self.detect_fn, "report") else ""))
+
+    def _maybe_report(self):
+        if not self.report_interval:
+            return
+        now = time.perf_counter()
+        if now - self._last_report >= self.report_interval:
+            self._last_report = now
+            print("[pipeline]", self.report())
+
+
+class FrameBuffer:
+    """
+    Ring buffer of the most recent annotated frames, for headless sessions.
+
+    Instances are callable, so one can be passed directly as a detector's on_frame hook.
+    """
+
+    def __init__(self, maxlen=1):
+        self._frames = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def __call__(self, frame):
+        with self._lock:
+            self._frames.append(frame)
+
+    def latest(self):
+        with self._lock:
+            return self._frames[-1] if self._frames else None
+
+    def frames(self):
+        with self._lock:
+            return list(self._frames)
@@ -1,116 +1,160 @@
 import cv2
-import json
-import os
 from datetime import datetime
 
-# -----------------------------
-# CONFIG
-# -----------------------------
-import os
-
-# Prefer repository-local paths. Keep them relative so this project works across machines.
-REPO_ROOT = os.path.dirname(__file__)
-MODEL_PATH = os.path.join(REPO_ROOT, "models", "face_recognizer.yml")
-LABELS_PATH = os.path.join(REPO_ROOT, "models", "labels.json")
-CONFIDENCE_THRESHOLD = 90  # Lower = more accurate
-FACE_SIZE = (150, 150)     # Resize faces for recognition
+try:
+    from .pipeline import RecognitionPipeline
+    from .tracking import FaceTracker
+    from .scheduler import DetectionScheduler
+    from .log_sink import AttendanceLogWriter
+    from .model_registry import registry, ModelError, student_code
+    from .face_detectors import DetectorError
+    from .face_preprocess import prepare_face
+except ImportError:
+    from pipeline import RecognitionPipeline
+    from tracking import FaceTracker
+    from scheduler import DetectionScheduler
+    from log_sink import AttendanceLogWriter
+    from model_registry import registry, ModelError, student_code
+    from face_detectors import DetectorError
+    from face_preprocess import prepare_face
 
 # -----------------------------
-# LOAD LABELS
+# CONFIG
 # -----------------------------
-def detect(stop_event, result_container):
-    # Validate model and label files exist and give helpful errors
-    if not os.path.exists(LABELS_PATH):
-        print(f"[recognize] ERROR: labels file not found at {LABELS_PATH}")
-        print("Create './models/labels.json' or update LABELS_PATH in recognize.py")
-        stop_event.set()
-        return
-
-    with open(LABELS_PATH, "r") as f:
-        label_dict = json.load(f)
-
-    # Reverse dictionary {id: name}
-    inv_label_dict = {int(k): v for k, v in label_dict.items()}
-
+# Model / label paths live in model_registry.py; the model is loaded once per process.
+# The face detector backend (Haar, SSD, ONNX) is chosen there too, see face_detectors.py.
+# Matches are accepted under the model's calibrated thresholds (threshold.json, see
+# model_registry.FaceModel.accepts). Face crops are prepared like train.py's, see
+# face_preprocess.py.
+RECOGNIZE_WORKERS = 2      # Recognition threads in the live pipeline
+QUEUE_SIZE = 2             # Max pending items between pipeline stages (oldest dropped)
+TRACKING = True            # Recognize new / due-for-reverification tracks only (see tracking.py)
+FULL_SCAN_EVERY = 5        # Full-frame detector scan every N frames, track regions in between
+DETECT_SCALE = 1.0         # Run full scans on the frame resized by this factor (e.g. 0.5)
+ATTENDANCE_LOG = "attendance_log.csv"  # ".jsonl" for JSON Lines; written by a background thread
+
+def detect(stop_event, result_container, source=0, headless=False, on_frame=None, students=None,
+           on_recognized=None):
+    """
+    Run live recognition on a camera (cv2.VideoCapture source: device index or stream URL)
+    until stop_event is set; recognized student codes are appended to result_container
+    as soon as they are recognized.
+
+    students restricts matching to these student codes (e.g. the session's section);
+    None matches against everybody in the model. on_recognized(code, name, confidence,
+    timestamp) is called once per newly recognized student, on the frame loop thread.
+
+    headless=True skips cv2.imshow / waitKey (servers, Docker, detector threads). Frames
+    are only annotated when someone looks at them: in a window, or through on_frame(frame)
+    (e.g. a pipeline.FrameBuffer) if given.
+    """
     # -----------------------------
-    # LOAD MODEL
+    # LOAD MODEL & LABELS
     # -----------------------------
-    # Ensure OpenCV face module is available (needs opencv-contrib-python)
-    if not hasattr(cv2, 'face'):
-        print("[recognize] ERROR: cv2.face module not found. Install 'opencv-contrib-python' not just 'opencv-python'.")
+    # Shared, already-parsed model; only the first session in the process pays for loading
+    try:
+        model = registry.get()
+    except ModelError as exc:
+        print(f"[recognize] ERROR: {exc}")
         stop_event.set()
         return
 
-    if not os.path.exists(MODEL_PATH):
-        print(f"[recognize] ERROR: model file not found at {MODEL_PATH}")
-        print("Train a recognizer or copy a trained model to './models/face_recognizer.yml'")
-        stop_event.set()
-        return
+    # -----------------------------
+    # LOAD FACE DETECTOR
+    # -----------------------------
+    scoped = None  # (model, model restricted to students)
+    if students is not None:
+        students = set(students)
+        scoped = (model, model.restrict(students))
+        print(f"[recognize] matching against {len(students)} students "
+              f"({len(scoped[1].recognizer)} gallery entries)")
 
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
     try:
-        recognizer.read(MODEL_PATH)
-    except Exception as exc:
-        print(f"[recognize] ERROR reading model: {exc}")
+        with registry.detector() as face_detector:
+            _run(face_detector, stop_event, result_container, source, headless, on_frame, students, scoped,
+                 on_recognized)
+    except DetectorError as exc:
+        print(f"[recognize] ERROR: {exc}")
         stop_event.set()
-        return
 
-    # -----------------------------
-    # LOAD HAAR CASCADE
-    # -----------------------------
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
 
+def _run(face_detector, stop_event, result_container, source, headless, on_frame, students, scoped,
+                 on_recognized):
     # -----------------------------
     # START WEBCAM
     # -----------------------------
-    cap = cv2.VideoCapture(0)
-    print("[recognize] Webcam started...")
+    cap = cv2.VideoCapture(source)
+    print(f"[recognize] Webcam {source!r} started...")
 
     # Keep track of recognized students
     recognized_names = set()
 
-    # Optional: attendance log file
-    attendance_file = "attendance_log.csv"
-    if not os.path.exists(attendance_file):
-        with open(attendance_file, "w") as f:
-            f.write("Name,Time\n")
+    # Optional: attendance log file (batched off the frame loop)
+    attendance_log = AttendanceLogWriter(ATTENDANCE_LOG)
+
+    def session_model():
+        # picks up a hot-swapped model as soon as training publishes one
+        nonlocal scoped
+        model = registry.get()
+        if students is None:
+            return model
+        if scoped is None or scoped[0] is not model:
+            scoped = (model, model.restrict(students))
+        return scoped[1]
+
+    def recognize_faces(gray, boxes):
+        model = session_model()
+        # crops prepared as in training; all faces of a frame are matched together
+        return model.predict_batch([prepare_face(gray, box) for box in boxes])
+
+    tracker = FaceTracker() if TRACKING else None
+    detect_faces = DetectionScheduler(face_detector, tracker=tracker,
+                                      full_scan_every=FULL_SCAN_EVERY, scale=DETECT_SCALE)
+    pipeline = RecognitionPipeline(cap, detect_faces, recognize_faces, stop_event, tracker=tracker,
+                                   recognize_workers=RECOGNIZE_WORKERS, queue_size=QUEUE_SIZE).start()
 
     while not stop_event.is_set():
-        ret, frame = cap.read()
-        if not ret:
-            print("[recognize] Camera error")
-            break
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=5)
-
-        for (x, y, w, h) in faces:
-            # Resize face ROI for consistent prediction
-            face_roi = cv2.resize(gray[y:y+h, x:x+w], FACE_SIZE)
-
-            pred, confidence = recognizer.predict(face_roi)
-
+        result = pipeline.get(timeout=0.5)
+        if result is None:
+            if pipeline.failed:
+                print("[recognize] Camera error")
+                break
+            continue
+
+        frame = result.frame
+        annotate = not headless or on_frame is not None
+        model = registry.get()
+
+        for (x, y, w, h), pred, confidence in result.faces:
             # Determine name
-            if confidence < CONFIDENCE_THRESHOLD:
-                name = inv_label_dict.get(pred, "Unknown")
+            if model.accepts(pred, confidence):
+                name = model.name(pred)
             else:
                 name = "Unknown"
 
             # Track recognized students
-            if name != "Unknown" and name not in recognized_names:
-                recognized_names.add(name[-5:])
+            if name != "Unknown" and student_code(name) not in recognized_names:
+                recognized_names.add(student_code(name))
+                result_container.append(student_code(name))
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 print(f"[Attendance] {name} recognized at {timestamp}")
 
-                # Log attendance to CSV
-                with open(attendance_file, "a") as f:
-                    f.write(f"{name},{timestamp}\n")
+                # Log attendance (queued, written in batches)
+                attendance_log.write(name, timestamp)
+                if on_recognized is not None:
+                    on_recognized(student_code(name), name, float(confidence), timestamp)
 
             # Draw rectangle and label
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            cv2.putText(frame, name, (x, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            if annotate:
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                cv2.putText(frame, name, (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+        if on_frame is not None:
+            on_frame(frame)
+
+        if headless:
+            continue
 
         cv2.imshow("Face Recognition", frame)
 
@@ -118,7 +162,10 @@ def detect(stop_event, result_container):
             print("[recognize] Exiting...")
             break
 
+    pipeline.stop()
+    attendance_log.close()
+    print("[recognize] pipeline:", pipeline.report())
     cap.release()
-    cv2.destroyAllWindows()
-    result_container.extend(list(recognized_names))
+    if not headless:
+        cv2.destroyAllWindows()
 
@@ -0,0 +1,104 @@
+import cv2
+import time
+import threading
+
+try:
+    from .tracking import iou
+except ImportError:
+    from tracking import iou
+
+# Detection scheduler for the live pipeline.
+#
+# A full-frame cascade scan is the most expensive step per frame. The scheduler only runs
+# it every FULL_SCAN_EVERY frames (optionally on a downscaled copy, boxes mapped back to
+# full resolution); on the frames in between it searches small regions around the boxes
+# of existing tracks, all regions of a frame in one detect_batch() call (one forward pass
+# for the DNN detectors). New faces are therefore picked up within FULL_SCAN_EVERY frames.
+
+FULL_SCAN_EVERY = 5   # frames between full-frame scans (1 = every frame)
+DETECT_SCALE = 1.0    # full scans run on the frame resized by this factor (e.g. 0.5)
+ROI_MARGIN = 0.5      # search region around a track, as a fraction of its box size
+DUPLICATE_IOU = 0.5   # overlapping ROI hits above this IoU are treated as the same face
+
+
+class DetectionScheduler:
+    """
+    Callable detect_fn(gray) -> boxes for RecognitionPipeline.
+
+    detector is a face_detectors detector: detector(gray) and detector.detect_batch(images)
+    -> (x, y, w, h) boxes. Track boxes come from tracker.tracks; without a tracker every
+    frame is a full scan.
+    """
+
+    def __init__(self, detector, tracker=None, full_scan_every=FULL_SCAN_EVERY,
+                 scale=DETECT_SCALE, roi_margin=ROI_MARGIN):
+        self.detector = detector
+        self.tracker = tracker
+        self.full_scan_every = max(1, int(full_scan_every))
+        self.scale = scale
+        self.roi_margin = roi_margin
+
+        self.frames = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+        self.busy = 0.0
+        self._started = None
+        self._lock = threading.Lock()
+
+    def __call__(self, gray):
+        start = time.perf_counter()
+        if self._started is None:
+            self._started = start
+
+        track_boxes = [track.box for track in self.tracker.tracks] if self.tracker is not None else []
+
+        full = not track_boxes or self.frames % self.full_scan_every == 0
+        boxes = self.full_scan(gray) if full else self.roi_scan(gray, track_boxes)
+
+        with self._lock:
+            self.frames += 1
+            if full:
+                self.full_scans += 1
+            else:
+                self.roi_scans += 1
+            self.busy += time.perf_counter() - start
+        return boxes
+
+    def full_scan(self, gray):
+        if self.scale == 1.0:
+            return [tuple(int(v) for v in box) for box in self.detector(gray)]
+
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return [tuple(int(round(v / self.scale)) for v in box) for box in self.detector(small)]
+
+    def roi_scan(self, gray, track_boxes):
+        height, width = gray.shape[:2]
+        regions = []
+
+        for (x, y, w, h) in track_boxes:
+            mx, my = int(w * self.roi_margin), int(h * self.roi_margin)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(width, x + w + mx), min(height, y + h + my)
+            if x1 > x0 and y1 > y0:
+                regions.append((x0, y0, gray[y0:y1, x0:x1]))
+        if not regions:
+            return []
+
+        boxes = []
+        found = self.detector.detect_batch([roi for _, _, roi in regions])
+        for (x0, y0, _), roi_boxes in zip(regions, found):
+            for (rx, ry, rw, rh) in roi_boxes:
+                box = (int(rx) + x0, int(ry) + y0, int(rw), int(rh))
+                # neighbouring tracks' regions overlap, don't report a face twice
+                if all(iou(box, other) < DUPLICATE_IOU for other in boxes):
+                    boxes.append(box)
+
+        return boxes
+
+    def report(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self._started if self._started else 0.0
+            fps = self.frames / elapsed if elapsed else 0.0
+            ms = 1000.0 * self.busy / self.frames if self.frames else 0.0
+            return (f"detection {fps:.1f}fps ({ms:.1f}ms/frame), "
+                    f"{self.full_scans} full scans, {self.roi_scans} roi scans")
@@ -0,0 +1,45 @@
+import threading
+
+# Live recognition events of one attendance session.
+#
+# The detector thread publish()es an event whenever it recognizes a new student; any
+# number of readers (e.g. the server-sent-events endpoint, api/views.py) follow along with
+# since(last_id), which blocks until something newer arrives. Events are numbered from 1
+# and kept for the whole session, so a reader that reconnects with the last id it saw
+# (SSE's Last-Event-ID) misses nothing. close() publishes a final "closed" event.
+
+
+class SessionEvents:
+
+    def __init__(self):
+        self._events = []
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def publish(self, kind, **data):
+        with self._condition:
+            if self._closed:
+                return None
+            event = dict(data, id=len(self._events) + 1, type=kind)
+            self._events.append(event)
+            self._condition.notify_all()
+            return event
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._events.append({"id": len(self._events) + 1, "type": "closed"})
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def since(self, last_id=0, timeout=None):
+        """Events after last_id; waits up to timeout seconds for one if there are none yet."""
+        with self._condition:
+            if len(self._events) <= last_id and not self._closed:
+                self._condition.wait_for(lambda: len(self._events) > last_id or self._closed, timeout)
+            return self._events[last_id:]
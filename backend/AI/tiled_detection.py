@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+
+try:
+    from .model_registry import registry
+    from .face_detectors import DetectorError, BACKENDS
+except ImportError:
+    from model_registry import registry
+    from face_detectors import DetectorError, BACKENDS
+
+# Tiled face detection for high-resolution group photos.
+#
+# A 1920x1080 classroom photo with up to 50 faces: a detector run on the whole image
+# (downscaled to 300x300 for the SSD, or with a coarse cascade scale step) loses the small
+# faces in the back rows. The photo is cut into overlapping TILE_SIZE tiles, each tile is
+# detected at full resolution, and the tiles are spread over a thread pool (every worker
+# borrows its own detector from the registry pool and runs its tiles as one batch). One
+# extra pass over the whole, downscaled photo finds faces too large for a tile.
+#
+# A face on a seam is found in two tiles, possibly cut in one of them, so boxes are merged
+# with NMS: a box is dropped when it overlaps a better one by NMS_IOU or lies mostly
+# (CONTAINED) inside it.
+#
+#   python tiled_detection.py classroom.jpg --backend ssd --output annotated.jpg
+
+TILE_SIZE = 640      # tile width / height in pixels
+OVERLAP = 0.25       # fraction of a tile shared with its neighbour (> the largest seam face)
+WORKERS = 4          # detector threads per photo
+NMS_IOU = 0.4        # overlap above which the weaker of two boxes is dropped
+CONTAINED = 0.7      # share of a box inside a better one above which it is dropped
+FULL_PASS = True     # also detect on the whole photo resized to TILE_SIZE
+MAX_FACES = 50       # largest faces kept (docs/MULTI_FACE_DETECTION.md)
+
+
+def tile_grid(width, height, tile_size=TILE_SIZE, overlap=OVERLAP):
+    """(x, y, w, h) tiles covering the image, neighbours overlapping by `overlap` of a tile."""
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        step = max(1, int(tile_size * (1.0 - overlap)))
+        positions = list(range(0, length - tile_size, step))
+        return positions + [length - tile_size]  # last tile flush with the border
+
+    return [(x, y, min(tile_size, width), min(tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def merge_boxes(boxes, scores, nms_iou=NMS_IOU, contained=CONTAINED):
+    """Indices of the boxes kept by NMS, best (score, then size) first."""
+    if not len(boxes):
+        return []
+    boxes = np.asarray(boxes, dtype=np.float64)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    order = np.lexsort((-areas, -np.asarray(scores, dtype=np.float64)))
+
+    keep = []
+    while len(order):
+        best, rest = order[0], order[1:]
+        keep.append(int(best))
+        iw = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = iw * ih
+        overlap = inter / (areas[best] + areas[rest] - inter)
+        inside = inter / np.maximum(areas[rest], 1.0)
+        order = rest[(overlap <= nms_iou) & (inside <= contained)]
+    return keep
+
+
+class TiledResult:
+    def __init__(self, boxes, scores, tiles, seconds):
+        self.boxes = boxes
+        self.scores = scores
+        self.tiles = tiles
+        self.seconds = seconds
+
+    def report(self):
+        return f"{len(self.boxes)} faces in {1000 * self.seconds:.0f} ms ({self.tiles} tiles)"
+
+
+class TiledDetector:
+    """detect(image) -> TiledResult; one instance can serve several requests at once."""
+
+    def __init__(self, backend=None, tile_size=TILE_SIZE, overlap=OVERLAP, workers=WORKERS,
+                 nms_iou=NMS_IOU, full_pass=FULL_PASS, max_faces=MAX_FACES):
+        self.backend = backend
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.workers = max(1, int(workers))
+        self.nms_iou = nms_iou
+        self.full_pass = full_pass
+        self.max_faces = max_faces
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tiles")
+
+    def _detect_chunk(self, images):
+        with registry.detector(self.backend) as detector:
+            return detector.detect_scored_batch(images)
+
+    def detect(self, image):
+        """Faces of a BGR or gray photo, in full-image coordinates; raises DetectorError."""
+        start = time.perf_counter()
+        height, width = image.shape[:2]
+        tiles = tile_grid(width, height, self.tile_size, self.overlap)
+        crops = [image[y:y + h, x:x + w] for (x, y, w, h) in tiles]
+        offsets = [(x, y, 1.0) for (x, y, _, _) in tiles]
+
+        if self.full_pass and len(tiles) > 1:
+            scale = self.tile_size / max(width, height)
+            crops.append(cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+            offsets.append((0, 0, scale))
+
+        # contiguous chunks, one batch per worker
+        bounds = np.linspace(0, len(crops), min(self.workers, len(crops)) + 1).astype(int)
+        chunks = [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+        futures = [self._executor.submit(self._detect_chunk, crops[a:b]) for a, b in chunks]
+
+        boxes, scores = [], []
+        for (a, _), future in zip(chunks, futures):
+            for (ox, oy, scale), found in zip(offsets[a:], future.result()):
+                for (x, y, w, h), score in found:
+                    boxes.append((int(round(x / scale)) + ox, int(round(y / scale)) + oy,
+                                  int(round(w / scale)), int(round(h / scale))))
+                    scores.append(score)
+
+        keep = merge_boxes(boxes, scores, self.nms_iou)
+        if self.max_faces and len(keep) > self.max_faces:
+            keep = sorted(keep, key=lambda i: boxes[i][2] * boxes[i][3], reverse=True)[:self.max_faces]
+        return TiledResult([boxes[i] for i in keep], [scores[i] for i in keep], len(crops),
+                           time.perf_counter() - start)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiled face detection on group photos")
+    parser.add_argument("images", nargs="+", help="photos to scan")
+    parser.add_argument("--backend", choices=BACKENDS, default=registry.detector_backend)
+    parser.add_argument("--tile", type=int, default=TILE_SIZE, help="tile size in pixels")
+    parser.add_argument("--overlap", type=float, default=OVERLAP, help="tile overlap (fraction of a tile)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="detector threads")
+    parser.add_argument("--output", help="annotated copy of the (last) photo")
+    args = parser.parse_args()
+
+    tiled = TiledDetector(args.backend, args.tile, args.overlap, args.workers)
+    try:
+        for path in args.images:
+            image = cv2.imread(path)
+            if image is None:
+                print(f"[tiles] unreadable image: {path}")
+                continue
+
+            start = time.perf_counter()
+            with registry.detector(args.backend) as detector:
+                single = detector(image)
+            single_ms = 1000 * (time.perf_counter() - start)
+
+            result = tiled.detect(image)
+            print(f"[tiles] {os.path.basename(path)} {image.shape[1]}x{image.shape[0]}: {result.report()}; "
+                  f"single pass {len(single)} faces in {single_ms:.0f} ms")
+
+            if args.output:
+                for (x, y, w, h) in result.boxes:
+                    cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                cv2.imwrite(args.output, image)
+    except DetectorError as exc:
+        print("[tiles] ERROR:", exc)
+        return 1
+    finally:
+        tiled.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import threading
+from collections import deque, Counter
+
+# Lightweight IoU tracker for the live pipeline.
+#
+# Detections are matched to existing tracks by box overlap. A track is recognized while
+# it collects votes (one LBPH prediction per frame) and, once MIN_VOTES predictions in
+# the last VOTE_WINDOW agree, it is confirmed and only re-verified every REVERIFY_EVERY
+# frames. In a static classroom that replaces one predict per face per frame with a
+# handful per student, and a single-frame mismatch can no longer mark someone present.
+
+IOU_THRESHOLD = 0.3   # min overlap to continue a track
+MAX_MISSED = 5        # frames a track survives without a matching detection
+REVERIFY_EVERY = 15   # frames between re-recognitions of a confirmed track
+VOTE_WINDOW = 5       # most recent predictions kept per track
+MIN_VOTES = 3         # agreeing predictions needed to confirm a label
+PENDING_TIMEOUT = 10  # frames after which a lost (dropped) prediction is rescheduled
+
+UNCONFIRMED = -1
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    def __init__(self, track_id, box, vote_window):
+        self.id = track_id
+        self.box = box
+        self.missed = 0
+        self.age = 0                  # frames since the track was created
+        self.last_recognized = None   # age at the last scheduled prediction
+        self.pending = False          # a prediction is in flight
+        self.votes = deque(maxlen=vote_window)
+        self.label = UNCONFIRMED
+        self.distance = float("inf")
+
+    @property
+    def confirmed(self):
+        return self.label != UNCONFIRMED
+
+
+class FaceTracker:
+
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_missed=MAX_MISSED, reverify_every=REVERIFY_EVERY,
+                 vote_window=VOTE_WINDOW, min_votes=MIN_VOTES):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.reverify_every = reverify_every
+        self.vote_window = vote_window
+        self.min_votes = min_votes
+
+        self.tracks = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def update(self, boxes):
+        """
+        Match this frame's boxes to tracks. Returns [(track, needs_recognition)], one per box,
+        in box order. Tracks flagged for recognition are marked pending until observe().
+        """
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+
+        with self._lock:
+            pairs = sorted(((iou(track.box, box), t, b)
+                            for t, track in enumerate(self.tracks)
+                            for b, box in enumerate(boxes)), reverse=True)
+
+            matched_tracks = {}
+            for overlap, t, b in pairs:
+                if overlap < self.iou_threshold:
+                    break
+                if t in matched_tracks.values() or b in matched_tracks:
+                    continue
+                matched_tracks[b] = t
+
+            for t, track in enumerate(self.tracks):
+                if t not in matched_tracks.values():
+                    track.missed += 1
+
+            result = []
+            for b, box in enumerate(boxes):
+                if b in matched_tracks:
+                    track = self.tracks[matched_tracks[b]]
+                    track.box = box
+                    track.missed = 0
+                    track.age += 1
+                else:
+                    track = Track(self._next_id, box, self.vote_window)
+                    self._next_id += 1
+                    self.tracks.append(track)
+                result.append((track, self._schedule(track)))
+
+            self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+            return result
+
+    def _schedule(self, track):
+        if track.pending and track.age - track.last_recognized < PENDING_TIMEOUT:
+            return False
+        due = (not track.confirmed
+               or track.last_recognized is None
+               or track.age - track.last_recognized >= self.reverify_every)
+        if due:
+            track.pending = True
+            track.last_recognized = track.age
+        return due
+
+    def observe(self, track, label, distance):
+        """Record a prediction for a track and re-run the vote."""
+        with self._lock:
+            track.pending = False
+            track.votes.append((label, distance))
+
+            winner, count = Counter(l for l, _ in track.votes).most_common(1)[0]
+            if count >= self.min_votes:
+                track.label = winner
+                track.distance = sum(d for l, d in track.votes if l == winner) / count
+            elif track.confirmed and winner != track.label:
+                # the confirmed label lost its majority; go back to collecting votes
+                track.label = UNCONFIRMED
+                track.distance = float("inf")
@@ -9,124 +9,520 @@
 import os
 import cv2
 import json
+import time
+import argparse
 import numpy as np
+from contextlib import contextmanager
 from datetime import datetime
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .face_cache import FaceCache, file_hash
+    from .face_preprocess import prepare_face, FACE_SIZE, CLAHE_CLIP_LIMIT, CLAHE_TILE_GRID
+    from . import lbph_model
+    from .lbph_model import LBPHModel, binary_path, file_stamp
+except ImportError:
+    from face_cache import FaceCache, file_hash
+    from face_preprocess import prepare_face, FACE_SIZE, CLAHE_CLIP_LIMIT, CLAHE_TILE_GRID
+    import lbph_model
+    from lbph_model import LBPHModel, binary_path, file_stamp
 
 # -----------------------------
 # CONFIG
 # -----------------------------
-DATASET_DIR = r"C:\Users\j\Desktop\git tutor\student_attendace_system\dataset"
-MODEL_PATH = r"C:\Users\j\Desktop\git tutor\student_attendace_system\models\face_recognizer.yml"
-LABELS_PATH = r"C:\Users\j\Desktop\git tutor\student_attendace_system\models\labels.json"
+# Keep paths repository-local (same layout recognize.py reads from).
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(REPO_ROOT, "dataset")
+MODEL_PATH = os.path.join(REPO_ROOT, "models", "face_recognizer.yml")
+LABELS_PATH = os.path.join(REPO_ROOT, "models", "labels.json")
 
-# Create model folder if not exists
-os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+CACHE_DIR = os.path.join(REPO_ROOT, "cache", "faces")
 
-# Haar cascade for face detection
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg")
 
-# CLAHE for contrast improvement
-clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+# Detector settings (changing any of these, or face_preprocess.py's, invalidates the face cache)
+CASCADE_FILE = "haarcascade_frontalface_default.xml"
+SCALE_FACTOR = 1.1
+MIN_NEIGHBORS = 5
+MIN_FACE_SIZE = (50, 50)
 
-# -----------------------------
-# LOAD IMAGES
-# -----------------------------
-faces = []
-labels = []
-label_dict = {}
-
-print("[train] scanning dataset folder:", DATASET_DIR)
-
-label_id = 0
-
-for person in os.listdir(DATASET_DIR):
-    folder_path = os.path.join(DATASET_DIR, person)
-
-    if not os.path.isdir(folder_path):
-        continue
+# Preprocessing processes: None = one per CPU core, 1 = serial in this process
+WORKERS = None
 
-    print(f"[train] scanning folder: {person}")
-    label_dict[label_id] = person
+# Threshold calibration: fraction of each person's images held out of training and
+# scored against the model; scoring is capped so its cost doesn't grow with the dataset
+CALIBRATION_SPLIT = 0.2
+CALIBRATION_MAX_SAMPLES = 500
+CALIBRATION_BATCH = 64
+THRESHOLD_STD_FACTOR = 1.5
+CLASS_STD_MIN_SAMPLES = 3  # fewer genuine matches of a class: use the global spread
 
-    found_image = False
+# The Haar cascade is created per process (cv2 objects can't be pickled)
+face_cascade = None
 
-    for entry in os.scandir(folder_path):
-        if entry.is_file() and entry.name.lower().endswith((".jpg", ".png", ".jpeg")):
 
-            img_path = entry.path
-            img = cv2.imread(img_path)
+def init_preprocessor(single_threaded=False):
+    global face_cascade
 
-            if img is None:
-                print("[train] unreadable image:", img_path)
-                continue
+    if single_threaded:
+        # every pool process already owns a core; don't let OpenCV oversubscribe
+        cv2.setNumThreads(1)
 
-            gray_full = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # Haar cascade for face detection
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + CASCADE_FILE)
 
-            # detect faces and pick largest
-            dets = face_cascade.detectMultiScale(gray_full, scaleFactor=1.1, minNeighbors=5, minSize=(50,50))
-            if len(dets) == 0:
-                print("[train] no face detected in:", img_path)
-                continue
 
-            # choose largest face
-            x,y,w,h = max(dets, key=lambda r: r[2]*r[3])
-            face = gray_full[y:y+h, x:x+w]
-            face = clahe.apply(face)
-            face = cv2.resize(face, (150,150))
+def cache_params():
+    """Everything that affects a preprocessed face; used to fingerprint the face cache."""
+    return {
+        "opencv": cv2.__version__,
+        "cascade": CASCADE_FILE,
+        "scale_factor": SCALE_FACTOR,
+        "min_neighbors": MIN_NEIGHBORS,
+        "min_size": list(MIN_FACE_SIZE),
+        "clahe_clip_limit": CLAHE_CLIP_LIMIT,
+        "clahe_tile_grid": list(CLAHE_TILE_GRID),
+        "face_size": list(FACE_SIZE),
+    }
 
-            # add original
-            faces.append(face)
-            labels.append(label_id)
-            found_image = True
 
-            # augmentation: horizontal flip
-            faces.append(cv2.flip(face, 1))
-            labels.append(label_id)
-
-    if not found_image:
-        print(f"[train] no images found in {person}")
-
-    label_id += 1
-
-print(f"[train] total samples: {len(faces)}")
-print(f"[train] labels found: {label_dict}")
+@contextmanager
+def timed(stage, timings):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
 
-# docker exec -it 7587f0f898fd  python manage.py migrate
 
 # -----------------------------
-# TRAIN MODEL
+# PREPROCESS IMAGES
 # -----------------------------
-if len(faces) == 0:
-    print("[train] ERROR: No training images found!")
-    exit()
-
-recognizer = cv2.face.LBPHFaceRecognizer_create()
-recognizer.train(faces, np.array(labels))
-
-# Save model & labels
-recognizer.save(MODEL_PATH)
-with open(LABELS_PATH, "w") as f:
-    json.dump(label_dict, f)
-
-# Compute basic confidence stats on training set
-confidences = []
-for i, face in enumerate(faces):
-    lbl, conf = recognizer.predict(face)
-    confidences.append(conf)
-
-if len(confidences) > 0:
-    mean_conf = float(np.mean(confidences))
-    std_conf = float(np.std(confidences))
-    threshold = mean_conf + 1.5 * std_conf
-    try:
-        with open(os.path.join(os.path.dirname(MODEL_PATH), 'threshold.json'), 'w', encoding='utf-8') as tf:
-            json.dump({'mean': mean_conf, 'std': std_conf, 'threshold': threshold}, tf, indent=2)
-        print(f"[train] Saved threshold.json (threshold={threshold:.2f})")
-    except Exception as e:
-        print("[train] Could not save threshold.json:", e)
-
-print("[train] model successfully saved!")
-print("[train] training completed at", datetime.now())
+def preprocess_image(img_path):
+    """Return the largest detected face of an image, CLAHE-equalized and resized, or None."""
+    img = cv2.imread(img_path)
+
+    if img is None:
+        print("[train] unreadable image:", img_path)
+        return None
+
+    gray_full = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    # detect faces and pick largest
+    dets = face_cascade.detectMultiScale(gray_full, scaleFactor=SCALE_FACTOR, minNeighbors=MIN_NEIGHBORS, minSize=MIN_FACE_SIZE)
+    if len(dets) == 0:
+        print("[train] no face detected in:", img_path)
+        return None
+
+    # choose largest face
+    return prepare_face(gray_full, max(dets, key=lambda r: r[2]*r[3]))
+
+
+def preprocess_images(img_paths):
+    """Preprocess one shard of images; results keep input order (None = no usable face)."""
+    return [preprocess_image(path) for path in img_paths]
+
+
+def list_images(folder_path):
+    return [entry.path for entry in os.scandir(folder_path)
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def preprocess_folders(folders, workers=WORKERS, cache=None, hashes=None):
+    """
+    Return, for every folder, the usable faces it contains (in scandir order).
+
+    Images already in the face cache are served from it; the remaining ones are
+    sharded per folder across a process pool. Results are merged back in input
+    order, so the output matches the serial, uncached run exactly. A hashes dict
+    gets {file hash: folder index} of every image.
+    """
+    images = []
+    for folder in folders:
+        print(f"[train] scanning folder: {os.path.basename(folder)}")
+        images.append(list_images(folder))
+    return preprocess_paths(images, workers=workers, cache=cache, hashes=hashes)
+
+
+def preprocess_paths(images, workers=WORKERS, cache=None, hashes=None):
+    """preprocess_folders() for lists of image paths, one list per person."""
+    results = [[None] * len(paths) for paths in images]
+    keys = [[None] * len(paths) for paths in images]
+    pending = []  # (folder index, image indexes still to preprocess)
+
+    for i, paths in enumerate(images):
+        missing = []
+        for j, path in enumerate(paths):
+            if cache is not None or hashes is not None:
+                keys[i][j] = file_hash(path)
+            if hashes is not None:
+                hashes[keys[i][j]] = i
+            if cache is not None:
+                hit, face = cache.get(keys[i][j])
+                if hit:
+                    results[i][j] = face
+                    continue
+            missing.append(j)
+        if missing:
+            pending.append((i, missing))
+
+    shards = [[images[i][j] for j in missing] for i, missing in pending]
+
+    if workers == 1 or len(shards) <= 1:
+        init_preprocessor()
+        computed = [preprocess_images(shard) for shard in shards]
+    else:
+        with Pool(processes=workers, initializer=init_preprocessor, initargs=(True,)) as pool:
+            computed = pool.map(preprocess_images, shards, chunksize=1)
+
+    for (i, missing), shard_faces in zip(pending, computed):
+        for j, face in zip(missing, shard_faces):
+            results[i][j] = face
+            if cache is not None:
+                cache.put(keys[i][j], face)
+
+    return [[face for face in folder_results if face is not None] for folder_results in results]
+
+
+def add_samples(faces, labels, label_id, person_faces):
+    for face in person_faces:
+        # add original
+        faces.append(face)
+        labels.append(label_id)
+
+        # augmentation: horizontal flip
+        faces.append(cv2.flip(face, 1))
+        labels.append(label_id)
+
+
+def preprocess_dataset(dataset_dir, workers=WORKERS, cache=None, hashes=None):
+    """
+    Detect and crop faces for every person folder in dataset_dir.
+
+    Returns (person_faces, label_dict): person_faces[label_id] is the list of that
+    person's faces; label ids follow os.listdir order. A hashes dict gets {file hash:
+    label id} of every image.
+    """
+    persons = [p for p in os.listdir(dataset_dir) if os.path.isdir(os.path.join(dataset_dir, p))]
+    person_faces = preprocess_folders([os.path.join(dataset_dir, p) for p in persons], workers=workers, cache=cache,
+                                      hashes=hashes)
+
+    label_dict = {}
+    for label_id, (person, faces) in enumerate(zip(persons, person_faces)):
+        label_dict[label_id] = person
+
+        if not faces:
+            print(f"[train] no images found in {person}")
+
+    return person_faces, label_dict
+
+
+def split_holdout(person_faces, fraction=CALIBRATION_SPLIT, seed=0):
+    """
+    Split every person's faces into training samples (with flips) and held-out
+    originals used for threshold calibration. A person always keeps at least one
+    training image.
+    """
+    rng = np.random.default_rng(seed)
+    train_faces, train_labels = [], []
+    holdout_faces, holdout_labels = [], []
+
+    for label_id, faces in enumerate(person_faces):
+        n_holdout = min(int(round(len(faces) * fraction)), max(len(faces) - 1, 0))
+        held = set(rng.permutation(len(faces))[:n_holdout].tolist())
+
+        add_samples(train_faces, train_labels, label_id, [f for i, f in enumerate(faces) if i not in held])
+        for i in sorted(held):
+            holdout_faces.append(faces[i])
+            holdout_labels.append(label_id)
+
+    return train_faces, train_labels, holdout_faces, holdout_labels
+
+
+def predict_batch(recognizer, faces, batch_size=CALIBRATION_BATCH):
+    """Score faces in batches on a thread pool (OpenCV releases the GIL in predict)."""
+    def score(batch):
+        return [recognizer.predict(face) for face in batch]
+
+    batches = [faces[i:i + batch_size] for i in range(0, len(faces), batch_size)]
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        return [result for batch in executor.map(score, batches) for result in batch]
+
+
+def calibrate_thresholds(recognizer, faces, labels, max_samples=CALIBRATION_MAX_SAMPLES, seed=0):
+    """
+    Compute mean + THRESHOLD_STD_FACTOR * std of the genuine match distance (held-out
+    faces predicted as their own label) over (at most max_samples of) the given faces,
+    globally and per class. A class with fewer than CLASS_STD_MIN_SAMPLES genuine
+    matches uses the global std; a class with none gets no per-class value ("skipped")
+    and falls back to the global threshold at prediction time (model_registry).
+    Wrong matches are impostors: reported apart, with how many the threshold lets through.
+    """
+    if max_samples and len(faces) > max_samples:
+        idx = np.sort(np.random.default_rng(seed).choice(len(faces), max_samples, replace=False))
+        faces = [faces[i] for i in idx]
+        labels = [labels[i] for i in idx]
+
+    results = predict_batch(recognizer, faces)
+    labels = np.array(labels)
+    predicted = np.array([pred for pred, _ in results])
+    distances = np.array([conf for _, conf in results], dtype=np.float64)
+    genuine = predicted == labels
+
+    # no correct match at all: nothing to calibrate on but the raw distances
+    scored = distances[genuine] if genuine.any() else distances
+    mean_conf = float(np.mean(scored))
+    std_conf = float(np.std(scored))
+    threshold = mean_conf + THRESHOLD_STD_FACTOR * std_conf
+    impostors = distances[~genuine]
+    calibration = {
+        'mean': mean_conf,
+        'std': std_conf,
+        'threshold': threshold,
+        'samples': len(faces),
+        'accuracy': float(np.mean(genuine)),
+        'impostor': {
+            'samples': len(impostors),
+            'mean': float(np.mean(impostors)) if len(impostors) else None,
+            'min': float(np.min(impostors)) if len(impostors) else None,
+            'accepted': int(np.sum(impostors <= threshold)),
+        },
+        'per_class': {},
+        'skipped': [],
+    }
+
+    for label_id in np.unique(labels):
+        class_distances = distances[genuine & (labels == label_id)]
+        if not len(class_distances):
+            calibration['skipped'].append(int(label_id))
+            continue
+        spread = np.std(class_distances) if len(class_distances) >= CLASS_STD_MIN_SAMPLES else std_conf
+        calibration['per_class'][str(int(label_id))] = float(np.mean(class_distances) + THRESHOLD_STD_FACTOR * spread)
+
+    return calibration
+
+
+def load_label_dict():
+    with open(LABELS_PATH, "r") as f:
+        return {int(k): v for k, v in json.load(f).items()}
+
+
+def save_labels(label_dict):
+    tmp_labels = LABELS_PATH + ".tmp"
+    with open(tmp_labels, "w") as f:
+        json.dump(label_dict, f)
+    os.replace(tmp_labels, LABELS_PATH)
+
+
+def save_model(recognizer, label_dict, images=None):
+    """
+    Publish a model + labels for the running detectors (see model_registry.py).
+
+    All files are written next to their target and os.replace()d into place, the .yml
+    last: the registry reloads when the model file changes, so by then the new labels
+    and binary model are already there and a half-written model is never read. images
+    ({file hash: label}) is recorded in the binary model for later enrollments.
+    """
+    save_labels(label_dict)
+
+    # OpenCV picks the storage format from the extension, keep ".yml" last
+    tmp_model = os.path.splitext(MODEL_PATH)[0] + ".tmp.yml"
+    recognizer.save(tmp_model)
+
+    # binary twin for fast loading, stamped with the .yml it belongs to
+    LBPHModel.from_recognizer(recognizer, source=file_stamp(tmp_model)).save(binary_path(MODEL_PATH), images)
+    os.replace(tmp_model, MODEL_PATH)
+    lbph_model.clear_stale(MODEL_PATH)
+
+
+def enroll(folder, workers=WORKERS, cache=None, timings=None, sync_yml=False):
+    """
+    Add one person to the existing model without retraining everybody else.
+
+    The person's histograms are appended to the binary model (lbph_model.append), so
+    enrolling takes as long whatever the class size; the .yml is marked stale, and only
+    rewritten with sync_yml (or `python lbph_model.py models/face_recognizer.yml --to-yml`).
+    Existing label ids in labels.json are never renumbered. Images the model already
+    holds (by file hash, recorded in its meta.json) are skipped, so enrolling a folder
+    again only adds its new images.
+    """
+    timings = {} if timings is None else timings
+    folder = folder if os.path.isdir(folder) else os.path.join(DATASET_DIR, folder)
+    person = os.path.basename(os.path.normpath(folder))
+    model_dir = binary_path(MODEL_PATH)
+
+    if not os.path.isdir(folder):
+        print("[train] ERROR: enrollment folder not found:", folder)
+        return False
+    if not os.path.exists(LABELS_PATH) or not (os.path.exists(MODEL_PATH) or lbph_model.is_current(MODEL_PATH)):
+        print("[train] ERROR: no trained model to update, run a full training first")
+        return False
+
+    with timed("load", timings):
+        if not lbph_model.is_current(MODEL_PATH):
+            # a .yml from elsewhere: convert it once, later enrollments append to the result
+            print(f"[train] no binary model for {MODEL_PATH}, converting it")
+            lbph_model.convert(MODEL_PATH)
+        model = LBPHModel.load(model_dir)  # memory-mapped: nothing is read yet
+        known = lbph_model.read_meta(model_dir).get("images")
+
+    label_dict = load_label_dict()
+    existing = [label_id for label_id, name in label_dict.items() if name == person]
+    if existing and known is None:
+        print(f"[train] ERROR: {person} is already enrolled as label {existing[0]}, but this model doesn't "
+              "record its images, so those already in it can't be told apart (retrain once)")
+        return False
+    label_id = existing[0] if existing else max(label_dict, default=-1) + 1
+
+    with timed("hash", timings):
+        hashes = {path: file_hash(path) for path in list_images(folder)}
+    paths = [path for path, key in hashes.items() if key not in (known or {})]
+    if not paths:
+        print(f"[train] {person} ({label_id}): no images the model doesn't hold already")
+        return True
+    if existing:
+        print(f"[train] {person} already enrolled as label {label_id}, adding {len(paths)} new images")
+
+    with timed("preprocess", timings):
+        person_faces = preprocess_paths([paths], workers=workers, cache=cache)[0]
+
+    if not person_faces:
+        print(f"[train] ERROR: no usable face images found in {person}")
+        return False
+
+    faces = []
+    labels = []
+    add_samples(faces, labels, label_id, person_faces)
+
+    with timed("update", timings):
+        histograms = model.queries(faces)[0]
+
+    with timed("save", timings):
+        # labels first: the registry reloads when the binary model's meta.json changes
+        label_dict[label_id] = person
+        save_labels(label_dict)
+        lbph_model.append(model_dir, histograms, labels, {hashes[path]: label_id for path in paths})
+        if sync_yml:
+            lbph_model.sync_yml(MODEL_PATH)
+        else:
+            lbph_model.mark_stale(MODEL_PATH)
+
+    pending = lbph_model.pending_rows(MODEL_PATH)
+    print(f"[train] enrolled {person} as label {label_id} ({len(faces)} samples)"
+          + (f"; {pending} samples not in the .yml yet (--sync-yml)" if pending else ""))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the LBPH face recognizer")
+    parser.add_argument("--dataset", default=DATASET_DIR, help="dataset folder (one sub-folder per person)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="preprocessing processes (default: all cores, 1 = serial)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="preprocessed face cache folder")
+    parser.add_argument("--no-cache", action="store_true", help="preprocess every image, don't read or write the cache")
+    parser.add_argument("--clear-cache", action="store_true", help="drop the face cache before preprocessing")
+    parser.add_argument("--enroll", metavar="FOLDER", help="add one person folder to the existing model instead of retraining")
+    parser.add_argument("--sync-yml", action="store_true", help="with --enroll: also rewrite the .yml (slow, grows with the model)")
+    parser.add_argument("--calibration-split", type=float, default=CALIBRATION_SPLIT, help="fraction of each person's images held out for threshold calibration")
+    parser.add_argument("--calibration-samples", type=int, default=CALIBRATION_MAX_SAMPLES, help="max held-out samples scored during calibration (0 = all)")
+    args = parser.parse_args()
+
+    # Create model folder if not exists
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+
+    timings = {}
+
+    cache = None
+    if not args.no_cache:
+        cache = FaceCache(args.cache_dir, cache_params())
+        if args.clear_cache:
+            cache.clear()
+
+    # -----------------------------
+    # INCREMENTAL ENROLLMENT
+    # -----------------------------
+    if args.enroll:
+        enrolled = enroll(args.enroll, workers=args.workers, cache=cache, timings=timings, sync_yml=args.sync_yml)
+        if cache is not None:
+            # the cache only saw this person's images, keep everybody else's entries
+            cache.save(evict=False)
+        print("[train] stage timings: " + ", ".join(f"{stage}={secs:.2f}s" for stage, secs in timings.items()))
+        if enrolled:
+            print("[train] enrollment completed at", datetime.now())
+        return
+
+    # -----------------------------
+    # LOAD IMAGES
+    # -----------------------------
+    print("[train] scanning dataset folder:", args.dataset)
+
+    images = {}  # {file hash: label id}, kept in the model for later enrollments
+    with timed("preprocess", timings):
+        person_faces, label_dict = preprocess_dataset(args.dataset, workers=args.workers, cache=cache, hashes=images)
+
+    if cache is not None:
+        evicted = cache.save()
+        print(f"[train] face cache: {cache.hits} hits, {cache.misses} misses, {evicted} evicted")
+
+    faces, labels, holdout_faces, holdout_labels = split_holdout(person_faces, args.calibration_split)
+
+    print(f"[train] total samples: {len(faces) + 2 * len(holdout_faces)} ({len(holdout_faces)} held out for calibration)")
+    print(f"[train] labels found: {label_dict}")
+
+    # docker exec -it 7587f0f898fd  python manage.py migrate
+
+    # -----------------------------
+    # TRAIN MODEL
+    # -----------------------------
+    if len(faces) == 0:
+        print("[train] ERROR: No training images found!")
+        return
+
+    with timed("train", timings):
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.train(faces, np.array(labels))
+
+    # Calibrate the acceptance threshold on images the model hasn't seen
+    with timed("calibrate", timings):
+        if holdout_faces:
+            calibration = calibrate_thresholds(recognizer, holdout_faces, holdout_labels, args.calibration_samples)
+        else:
+            print("[train] WARNING: nothing held out (too few images per person), calibrating on training samples")
+            calibration = calibrate_thresholds(recognizer, faces, labels, args.calibration_samples)
+
+    # Fold the held-out images back in: LBPH update() appends them without retraining
+    if holdout_faces:
+        with timed("update", timings):
+            merge_faces, merge_labels = [], []
+            for face, label_id in zip(holdout_faces, holdout_labels):
+                add_samples(merge_faces, merge_labels, label_id, [face])
+            recognizer.update(merge_faces, np.array(merge_labels))
+
+    # Save thresholds, labels & model; the .yml last, the registry reloads them together
+    with timed("save", timings):
+        try:
+            threshold_path = os.path.join(os.path.dirname(MODEL_PATH), 'threshold.json')
+            with open(threshold_path + ".tmp", 'w', encoding='utf-8') as tf:
+                json.dump(calibration, tf, indent=2)
+            os.replace(threshold_path + ".tmp", threshold_path)
+            print(f"[train] Saved threshold.json (threshold={calibration['threshold']:.2f}, "
+                  f"{len(calibration['per_class'])} per-class, held-out accuracy={calibration['accuracy']:.2%}, "
+                  f"{calibration['impostor']['accepted']}/{calibration['impostor']['samples']} impostors accepted)")
+            unscored = [label_dict[label_id] for label_id in label_dict if str(label_id) not in calibration['per_class']]
+            if unscored:
+                print(f"[train] no genuine held-out match, global threshold used for: {', '.join(unscored)}")
+        except Exception as e:
+            print("[train] Could not save threshold.json:", e)
+
+        save_model(recognizer, label_dict, images)
+
+    print("[train] model successfully saved!")
+    print("[train] stage timings: " + ", ".join(f"{stage}={secs:.2f}s" for stage, secs in timings.items()))
+    print("[train] training completed at", datetime.now())
+
+
+if __name__ == "__main__":
+    main()
 
 
 
@@ -5,12 +5,21 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+The live session event stream (/api/sessions/{id}/events/) needs an ASGI server:
+uvicorn CAV.asgi:application (see dockerfile)
 """
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CAV.settings')
 
 application = get_asgi_application()
+
+if settings.DEBUG:
+    # static files (admin) as runserver serves them
+    application = ASGIStaticFilesHandler(application)
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_recognitions(apps, schema_editor):
+    # keep the first recognition of a student per session
+    AIRecognitionResult = apps.get_model("api", "AIRecognitionResult")
+    first_ids = (
+        AIRecognitionResult.objects.values("session", "student")
+        .annotate(first_id=Min("id"))
+        .values_list("first_id", flat=True)
+    )
+    AIRecognitionResult.objects.exclude(id__in=list(first_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_attendancesession_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_recognitions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='airecognitionresult',
+            constraint=models.UniqueConstraint(fields=('session', 'student'), name='unique_session_student_recognition'),
+        ),
+    ]
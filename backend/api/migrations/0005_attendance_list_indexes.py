@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_airecognitionresult_unique_session_student_recognition'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['-timestamp', '-id'], name='attendance_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['student', '-timestamp', '-id'], name='attendance_student_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['status', '-timestamp', '-id'], name='attendance_status_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancesession',
+            index=models.Index(fields=['-created_at', '-id'], name='session_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancesession',
+            index=models.Index(fields=['course', '-created_at', '-id'], name='session_course_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancesession',
+            index=models.Index(fields=['section', '-created_at', '-id'], name='session_section_created_idx'),
+        ),
+    ]
@@ -339,6 +339,15 @@ class AttendanceSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        # /api/sessions/ pages by (-created_at, -id), optionally within a course or section;
+        # date filters are created_at ranges
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="session_created_idx"),
+            models.Index(fields=["course", "-created_at", "-id"], name="session_course_created_idx"),
+            models.Index(fields=["section", "-created_at", "-id"], name="session_section_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.course.code} - {self.date}"
 
@@ -385,6 +394,12 @@ class AttendanceRecord(models.Model):
                 name="unique_session_student"
             )
         ]
+        # /api/attendance/ pages by (-timestamp, -id), optionally for one student or status
+        indexes = [
+            models.Index(fields=["-timestamp", "-id"], name="attendance_timestamp_idx"),
+            models.Index(fields=["student", "-timestamp", "-id"], name="attendance_student_ts_idx"),
+            models.Index(fields=["status", "-timestamp", "-id"], name="attendance_status_ts_idx"),
+        ]
 
     def __str__(self):
         return f"{self.student.student_code} - {self.status}"
@@ -393,4 +408,12 @@ class AttendanceRecord(models.Model):
 class AIRecognitionResult(models.Model):
     session = models.ForeignKey(AttendanceSession, on_delete=models.CASCADE)
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "student"],
+                name="unique_session_student_recognition"
+            )
+        ]
@@ -0,0 +1,16 @@
+# api/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class AttendanceCursorPagination(CursorPagination):
+    # keyset pagination: a page costs the same however deep it is and however big the table.
+    # Records closed in one bulk insert share a timestamp: -id keeps their order stable
+    # between requests, so no row is skipped or repeated across pages.
+    ordering = ("-timestamp", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class SessionCursorPagination(AttendanceCursorPagination):
+    ordering = ("-created_at", "-id")
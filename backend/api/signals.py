@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from AI.embedding_store import remove_students, StoreError
+from .models import Student
+
+
+# A student's face embedding is stored under their student code (AI/embedding_store.py).
+# Once the student is deleted (API, admin, or cascaded from their section / batch) or
+# their code changes, that vector must not match anybody anymore: it is removed as soon
+# as the change is committed.
+
+def _remove_embedding(code):
+    def remove():
+        try:
+            remove_students([code])
+        except (StoreError, OSError, ValueError) as exc:
+            print(f"[students] could not remove {code} from the embedding store: {exc}")
+    transaction.on_commit(remove)
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    _remove_embedding(instance.student_code)
+
+
+@receiver(pre_save, sender=Student)
+def student_code_changed(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    previous = Student.objects.filter(pk=instance.pk).values_list("student_code", flat=True).first()
+    if previous is not None and previous != instance.student_code:
+        _remove_embedding(previous)
@@ -1,3 +1,716 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import functools
+import json
+import math
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    User, DepBatch, Section, Student, Course,
+    AttendanceSession, AttendanceRecord, AIRecognitionResult
+)
+from . import signals, views
+from AI import attendance_session, lbph_model, train
+from AI.log_sink import BatchWriter
+from AI.embedding_store import EmbeddingStore, normalize, remove_students
+from AI.lbph_model import Thresholds
+from AI.model_registry import ModelError, THRESHOLD_PATH, DEFAULT_THRESHOLD
+
+
+def create_fixture(target):
+    """The teacher, department batch and course every API test starts from, set on target."""
+    target.teacher = User.objects.create_user(
+        email="teacher@example.com", password="password", role="teacher",
+        first_name="Test", last_name="Teacher"
+    )
+    target.dep_batch = DepBatch.objects.create(dep="Software", batch="2025")
+    target.course = Course.objects.create(name="Course 0", code="C0", teacher=target.teacher)
+
+
+def create_students(sections, count, prefix=""):
+    """count students coded prefix + 00000, 00001, ..., spread over sections in turn."""
+    return Student.objects.bulk_create([
+        Student(student_code=f"{prefix}{i:05d}", first_name="Student", last_name=str(i),
+                section=sections[i % len(sections)])
+        for i in range(count)
+    ])
+
+
+class TeacherClientMixin:
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+
+class ApiTestCase(TeacherClientMixin, TestCase):
+    """create_fixture() once per class; test classes add their own data in setUpTestData."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_fixture(cls)
+
+
+class ApiTransactionTestCase(TeacherClientMixin, TransactionTestCase):
+    """create_fixture() before every test, for tests whose requests run on other threads."""
+
+    def setUp(self):
+        create_fixture(self)
+        super().setUp()
+
+
+class AttendanceListQueryTests(ApiTestCase):
+    """List endpoints fetch their nested serializers' objects in a fixed number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        sections = [Section.objects.create(name=f"S{i}", dep_batch=cls.dep_batch) for i in range(2)]
+        students = create_students(sections, 100)
+        courses = [cls.course, Course.objects.create(name="Course 1", code="C1", teacher=cls.teacher)]
+        sessions = [
+            AttendanceSession.objects.create(course=courses[i % 2], created_by=cls.teacher, section=sections[i % 2])
+            for i in range(10)
+        ]
+        # 1,000 records: every student in every session
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(session=session, student=student, status="present")
+            for session in sessions for student in students
+        ])
+
+    def test_attendance_records(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/attendance/", {"page_size": 1000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 1000)
+
+    def test_sessions(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/sessions/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 10)
+
+    def test_students(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/students/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 100)
+
+    def test_courses(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/courses/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+
+class AttendanceListPaginationTests(ApiTestCase):
+    """Attendance and session lists are paged by cursor and filtered in the database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.sections = [Section.objects.create(name=f"S{i}", dep_batch=cls.dep_batch) for i in range(2)]
+        cls.students = create_students(cls.sections, 20)
+        cls.courses = [cls.course, Course.objects.create(name="Course 1", code="C1", teacher=cls.teacher)]
+        cls.sessions = [
+            AttendanceSession.objects.create(course=cls.courses[i % 2], created_by=cls.teacher, section=cls.sections[i % 2])
+            for i in range(4)
+        ]
+        # 80 records, absent on every fourth student
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(session=session, student=student, status="absent" if i % 4 == 0 else "present")
+            for session in cls.sessions for i, student in enumerate(cls.students)
+        ])
+        # the first session's records are from a week ago
+        AttendanceRecord.objects.filter(session=cls.sessions[0]).update(
+            timestamp=timezone.now() - datetime.timedelta(days=7)
+        )
+
+    def records(self, **params):
+        response = self.client.get("/api/attendance/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_cursor_pages(self):
+        seen = []
+        url, params = "/api/attendance/", {"page_size": 30}
+        while url:
+            with self.assertNumQueries(1):
+                page = self.client.get(url, params).json()
+            seen += [record["id"] for record in page["results"]]
+            url, params = page["next"], None
+        self.assertEqual(len(seen), 80)
+        self.assertEqual(len(set(seen)), 80)
+        timestamps = list(AttendanceRecord.objects.order_by("-timestamp").values_list("id", flat=True))
+        self.assertEqual(seen, timestamps)
+
+    def test_cursor_pages_with_equal_timestamps(self):
+        # a session closed in one bulk insert: every record has the same timestamp
+        AttendanceRecord.objects.update(timestamp=timezone.now())
+        seen = []
+        url, params = "/api/attendance/", {"page_size": 7}
+        while url:
+            page = self.client.get(url, params).json()
+            seen += [record["id"] for record in page["results"]]
+            url, params = page["next"], None
+        self.assertEqual(seen, sorted(AttendanceRecord.objects.values_list("id", flat=True), reverse=True))
+
+    def test_default_page_size(self):
+        self.assertEqual(len(self.records()), 50)
+        self.assertEqual(len(self.records(page_size=5000)), 80)
+
+    def test_record_filters(self):
+        self.assertEqual(len(self.records(course=self.courses[0].id, page_size=100)), 40)
+        self.assertEqual(len(self.records(section=self.sections[1].id, page_size=100)), 40)
+        self.assertEqual(len(self.records(session=self.sessions[2].id)), 20)
+        self.assertEqual(len(self.records(student=self.students[3].id)), 4)
+        self.assertEqual(len(self.records(student_code="00004")), 4)
+        self.assertEqual(len(self.records(status="absent")), 20)
+        self.assertEqual(len(self.records(status="absent", course=self.courses[1].id)), 10)
+
+    def test_record_date_filters(self):
+        today = timezone.localdate()
+        week_ago = today - datetime.timedelta(days=7)
+        self.assertEqual(len(self.records(date=today.isoformat(), page_size=100)), 60)
+        self.assertEqual(len(self.records(date=week_ago.isoformat())), 20)
+        self.assertEqual(len(self.records(date_to=(today - datetime.timedelta(days=1)).isoformat())), 20)
+        self.assertEqual(len(self.records(date_from=week_ago.isoformat(), page_size=100)), 80)
+
+    def test_invalid_filters(self):
+        for params in ({"course": "x"}, {"date": "yesterday"}, {"status": "late"}):
+            response = self.client.get("/api/attendance/", params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_session_filters(self):
+        response = self.client.get("/api/sessions/", {"course": self.courses[1].id})
+        self.assertEqual([s["id"] for s in response.json()["results"]],
+                         [self.sessions[3].id, self.sessions[1].id])
+        response = self.client.get("/api/sessions/", {"section": self.sections[0].id, "page_size": 1})
+        page = response.json()
+        self.assertEqual(len(page["results"]), 1)
+        self.assertIsNotNone(page["next"])
+        response = self.client.get("/api/sessions/", {"is_active": "false"})
+        self.assertEqual(response.json()["results"], [])
+
+
+class SessionCloseTests(ApiTestCase):
+    """Closing a session takes the same queries whatever the section size."""
+
+    def session(self, students):
+        section = Section.objects.create(name=f"S{students}", dep_batch=self.dep_batch)
+        create_students([section], students, prefix=f"{students}-")
+        return AttendanceSession.objects.create(course=self.course, created_by=self.teacher, section=section)
+
+    def record_batches(self, students):
+        # bulk inserts are split by the database's parameter limit (999 on SQLite)
+        fields = [field for field in AttendanceRecord._meta.concrete_fields if not field.primary_key]
+        return math.ceil(students / connection.ops.bulk_batch_size(fields, [None] * students))
+
+    def close(self, session, recognized):
+        with mock.patch.object(views, "stop_session", return_value=recognized):
+            return self.client.post(f"/api/sessions/{session.id}/close/")
+
+    def test_constant_queries(self):
+        for students in (10, 200):
+            session = self.session(students)
+            recognized = [f"{students}-{i:05d}" for i in range(0, students, 3)]
+            # session, BEGIN, codes, recognitions insert, recognized ids, section, records, UPDATE, COMMIT
+            with self.assertNumQueries(8 + self.record_batches(students)):
+                response = self.close(session, recognized)
+            self.assertEqual(response.status_code, 200)
+            records = AttendanceRecord.objects.filter(session=session)
+            self.assertEqual(records.count(), students)
+            self.assertEqual(records.filter(status="present").count(), len(recognized))
+            session.refresh_from_db()
+            self.assertFalse(session.is_active)
+
+    def test_duplicate_recognitions_ignored(self):
+        session = self.session(10)
+        student = Student.objects.get(student_code="10-00001")
+        AIRecognitionResult.objects.create(session=session, student=student)
+        # recognized live (stored by the recorder) and again by the detector, twice
+        response = self.close(session, ["10-00001", "10-00001", "10-00002"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AIRecognitionResult.objects.filter(session=session).count(), 2)
+        self.assertEqual(AttendanceRecord.objects.filter(session=session, status="present").count(), 2)
+        with self.assertRaises(IntegrityError):
+            AIRecognitionResult.objects.create(session=session, student=student)
+
+    def test_existing_records_kept(self):
+        session = self.session(10)
+        student = Student.objects.get(student_code="10-00001")
+        AttendanceRecord.objects.create(session=session, student=student, status="permission")
+        self.close(session, ["10-00001"])
+        self.assertEqual(AttendanceRecord.objects.get(session=session, student=student).status, "permission")
+        self.assertEqual(AttendanceRecord.objects.filter(session=session).count(), 10)
+
+
+class SessionCaptureTests(ApiTestCase):
+    """Photos uploaded to a session are recognized in memory and recorded once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.section = Section.objects.create(name="A", dep_batch=cls.dep_batch)
+        create_students([cls.section], 3)
+        cls.session = AttendanceSession.objects.create(course=cls.course, created_by=cls.teacher, section=cls.section)
+        # noise compresses badly: the PNG is larger than FILE_UPLOAD_MAX_MEMORY_SIZE
+        noise = np.random.default_rng(0).integers(0, 256, (1000, 1200, 3), dtype=np.uint8)
+        cls.photo = cv2.imencode(".png", noise)[1].tobytes()
+
+    def result(self, *codes):
+        matches = [
+            {"student_code": code, "name": code, "confidence": 42.0, "face_box": [0, 0, 10, 10], "image": 0}
+            for code in codes
+        ]
+        return {"matches": matches, "unidentified": [], "faces": len(matches), "seconds": 0.1}
+
+    def capture(self, session=None, **files):
+        files = files or {"image": SimpleUploadedFile("photo.png", self.photo, "image/png")}
+        return self.client.post(f"/api/sessions/{(session or self.session).id}/capture/", files, format="multipart")
+
+    @mock.patch.object(views, "recognize_photos")
+    def test_recognized_students_recorded_once(self, recognize_photos):
+        recognize_photos.return_value = self.result("00000", "00001")
+        with mock.patch("django.core.files.uploadedfile.TemporaryUploadedFile.__init__",
+                        side_effect=AssertionError("capture upload spooled to disk")):
+            response = self.capture()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["success"])
+        self.assertEqual(response.data["students_identified"], 2)
+        self.assertEqual([m["student_id"] for m in response.data["matches"]], ["00000", "00001"])
+
+        images, = recognize_photos.call_args.args
+        self.assertEqual(images[0].shape, (1000, 1200, 3))
+        self.assertEqual(sorted(recognize_photos.call_args.kwargs["students"]), ["00000", "00001", "00002"])
+
+        self.capture()
+        self.assertEqual(
+            sorted(AIRecognitionResult.objects.filter(session=self.session).values_list("student__student_code", flat=True)),
+            ["00000", "00001"]
+        )
+
+    @mock.patch.object(views, "recognize_photos")
+    def test_no_faces(self, recognize_photos):
+        recognize_photos.return_value = self.result()
+        response = self.capture()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["success"])
+        self.assertFalse(AIRecognitionResult.objects.exists())
+
+    @mock.patch.object(views, "recognize_photos", side_effect=ModelError("no trained model"))
+    def test_no_model(self, recognize_photos):
+        self.assertEqual(self.capture().status_code, 503)
+
+    @mock.patch.object(views, "recognize_photos")
+    def test_rejected_uploads(self, recognize_photos):
+        response = self.capture(image=SimpleUploadedFile("photo.png", b"not an image", "image/png"))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "not a readable image")
+        response = self.client.post(f"/api/sessions/{self.session.id}/capture/", {}, format="multipart")
+        self.assertEqual(response.status_code, 400)
+        with mock.patch.object(views, "CAPTURE_MAX_BYTES", 1024):
+            self.assertEqual(self.capture().status_code, 413)
+
+        closed = AttendanceSession.objects.create(
+            course=self.course, created_by=self.teacher, section=self.section, is_active=False
+        )
+        self.assertEqual(self.capture(closed).status_code, 400)
+        recognize_photos.assert_not_called()
+
+
+class SessionManagerStopTests(SimpleTestCase):
+    """stop() returns once the detector thread has finished, at most after its timeout."""
+
+    def setUp(self):
+        self.manager = attendance_session.SessionManager()
+        self.release = threading.Event()
+        self.finished = threading.Event()
+        self.recorded = []
+        self.recorder = BatchWriter(lambda batch: self.recorded.extend(event["student_code"] for event in batch),
+                                    flush_interval=60)
+
+    def fake_detect(self, stop_event, result_container, on_recognized=None, **kwargs):
+        for code in ("00000", "00001"):
+            result_container.append(code)
+            on_recognized(code, f"Student_{code}", 42.0, "08:00:00")
+            if code == "00000":
+                stop_event.wait()
+                self.release.wait(5)  # e.g. a camera that takes a while to let go
+        self.finished.set()
+
+    def start(self, session_id=1):
+        return self.manager.start(session_id, source="fake", recorder=self.recorder)
+
+    @mock.patch.object(attendance_session, "detect")
+    def test_stop_joins_worker(self, detect):
+        detect.side_effect = self.fake_detect
+        session = self.start()
+        threading.Timer(0.2, self.release.set).start()
+        self.assertEqual(self.manager.stop(1), ["00000", "00001"])
+        self.assertTrue(self.finished.is_set())
+        self.assertFalse(session.is_alive())
+        self.assertTrue(session.events.closed)
+        self.assertEqual(self.recorded, ["00000", "00001"])
+        self.assertEqual(self.manager.active(), [])
+
+    @mock.patch.object(attendance_session, "detect")
+    def test_stop_timeout(self, detect):
+        detect.side_effect = self.fake_detect
+        session = self.start()
+        self.assertEqual(self.manager.stop(1, timeout=0.1), ["00000"])
+        self.assertTrue(session.is_alive())
+        # recorded rows are flushed when stop() returns, later recognitions aren't recorded
+        self.assertEqual(self.recorded, ["00000"])
+        # the worker keeps its camera until it ends
+        self.assertEqual(self.manager.active(), [1])
+        with self.assertRaises(attendance_session.SessionError):
+            self.manager.start(2, source="fake")
+
+        self.release.set()
+        session.thread.join(5)
+        self.assertEqual(self.recorded, ["00000"])
+        self.assertEqual(self.manager.active(), [])
+        self.recorder = None
+        self.start(2)
+        self.assertEqual(self.manager.stop(2), ["00000", "00001"])
+
+
+class AsyncSessionCloseTests(ApiTransactionTestCase):
+    """"async": true closes on a background thread, followed through close-status."""
+
+    def setUp(self):
+        super().setUp()
+        section = Section.objects.create(name="A", dep_batch=self.dep_batch)
+        create_students([section], 3)
+        self.session = AttendanceSession.objects.create(course=self.course, created_by=self.teacher, section=section)
+        self.release = threading.Event()
+        # close states are kept per process, keyed by session id
+        patcher = mock.patch.dict(views._closing, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def close(self):
+        return self.client.post(f"/api/sessions/{self.session.id}/close/", {"async": True}, format="json")
+
+    def status(self):
+        return self.client.get(f"/api/sessions/{self.session.id}/close-status/").data
+
+    def wait_closed(self):
+        for thread in threading.enumerate():
+            if thread.name == f"close-{self.session.id}":
+                thread.join(5)
+
+    def slow_stop(self, session_id):
+        self.release.wait(5)
+        return ["00000", "00001"]
+
+    def test_close_in_background(self):
+        self.assertEqual(self.status(), {"status": "active"})
+        with mock.patch.object(views, "stop_session", side_effect=self.slow_stop) as stop_session:
+            response = self.close()
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data["status"], "closing")
+            self.assertTrue(response.data["status_url"].endswith(f"/api/sessions/{self.session.id}/close-status/"))
+            self.assertEqual(self.status(), {"status": "closing"})
+            # a repeated request joins the close already running
+            self.assertEqual(self.close().status_code, 202)
+            self.release.set()
+            self.wait_closed()
+        stop_session.assert_called_once_with(self.session.id)
+        self.assertEqual(self.status(), {"status": "closed", "present": 2, "absent": 1})
+
+    def test_failed_close(self):
+        with mock.patch.object(views, "stop_session", side_effect=RuntimeError("camera stuck")):
+            self.close()
+            self.wait_closed()
+        self.assertEqual(self.status(), {"status": "failed", "detail": "camera stuck"})
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.is_active)
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+
+class RunningSessionTestCase(ApiTransactionTestCase):
+    """Sessions started through the API, with a fake detector instead of the camera."""
+
+    def setUp(self):
+        super().setUp()
+        self.section = Section.objects.create(name="A", dep_batch=self.dep_batch)
+        create_students([self.section], 3)
+        self.recognized = threading.Event()
+        patcher = mock.patch.object(attendance_session, "manager", attendance_session.SessionManager())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_detect(self, stop_event, result_container, on_recognized=None, students=None, on_frame=None,
+                    **kwargs):
+        # reported through on_recognized only: whatever is stored comes from the recorder
+        for code in students[:2]:
+            on_recognized(code, f"Student_{code}", 42.0, "08:00:00")
+        if on_frame is not None:
+            on_frame(np.full((48, 64, 3), 200, dtype=np.uint8))
+        self.recognized.set()
+        stop_event.wait()
+
+    def start(self, headless=True):
+        response = self.client.post(
+            "/api/sessions/", {"course_id": self.course.id, "section": self.section.id, "headless": headless},
+            format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self.recognized.wait(5))
+        self.addCleanup(attendance_session.manager.stop, response.data["id"])
+        return response.data["id"]
+
+
+class SessionEventStreamTests(RunningSessionTestCase):
+    """A running session's recognitions are streamed as SSE and stored by its recorder."""
+
+    async def read(self, session_id, last_event_id):
+        response = await AsyncClient().get(f"/api/sessions/{session_id}/events/", headers={"Last-Event-ID": last_event_id})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = []
+        async for chunk in response.streaming_content:
+            event = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+            events.append({"id": int(event["id"]), "type": event["event"], **json.loads(event["data"])})
+            if event["event"] == "closed":
+                break
+            if len(events) == 1:
+                # close while the stream is open: it ends with the "closed" event
+                await asyncio.to_thread(self.client.post, f"/api/sessions/{session_id}/close/")
+        return events
+
+    @mock.patch.object(attendance_session, "detect")
+    def test_stream_resumes_and_recorder_stores(self, detect):
+        detect.side_effect = self.fake_detect
+        session_id = self.start()
+
+        events = asyncio.run(self.read(session_id, "1"))
+        self.assertEqual([(event["id"], event["type"]) for event in events], [(2, "recognized"), (3, "closed")])
+        self.assertEqual(events[0]["student_code"], "00001")
+        self.assertEqual(events[0]["confidence"], 42.0)
+
+        self.assertEqual(
+            sorted(AIRecognitionResult.objects.filter(session_id=session_id).values_list("student__student_code", flat=True)),
+            ["00000", "00001"]
+        )
+        records = AttendanceRecord.objects.filter(session_id=session_id)
+        self.assertEqual(records.filter(status="present").count(), 2)
+        self.assertEqual(records.filter(status="absent").count(), 1)
+
+    async def first_event(self, session_id):
+        response = await AsyncClient().get(f"/api/sessions/{session_id}/events/")
+        chunk = await anext(aiter(response.streaming_content))
+        return chunk.decode(), attendance_session.manager.active()
+
+    @mock.patch.object(attendance_session, "detect")
+    def test_event_delivered_while_running(self, detect):
+        detect.side_effect = self.fake_detect
+        session_id = self.start()
+
+        chunk, running = asyncio.run(self.first_event(session_id))
+        self.assertTrue(chunk.startswith("id: 1\nevent: recognized\n"))
+        self.assertIn('"student_code": "00000"', chunk)
+        # delivered by the ASGI handler while the detector still runs
+        self.assertEqual(running, [session_id])
+        self.assertTrue(AttendanceSession.objects.get(pk=session_id).is_active)
+        self.client.post(f"/api/sessions/{session_id}/close/")
+
+    def test_unknown_session(self):
+        response = asyncio.run(AsyncClient().get("/api/sessions/999/events/"))
+        self.assertEqual(response.status_code, 404)
+
+
+class ThresholdTests(SimpleTestCase):
+    """threshold.json never turns into a threshold that rejects every face."""
+
+    def load(self, data):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "threshold.json")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(data if isinstance(data, str) else json.dumps(data))
+            return Thresholds.load(path, DEFAULT_THRESHOLD)
+
+    def test_shipped_file_accepts_normal_distance(self):
+        thresholds = Thresholds.load(THRESHOLD_PATH, DEFAULT_THRESHOLD)
+        self.assertGreater(thresholds.threshold, 0)
+        self.assertTrue(thresholds.accepts(0, 60.0))
+
+    def test_unusable_files_fall_back_to_default(self):
+        for data in ({"mean": 0.0, "std": 0.0, "threshold": 0.0},   # the old placeholder
+                     {"mean": 20.0, "std": 5.0, "threshold": 27.5},  # uncalibrated format
+                     {"threshold": 0.0, "per_class": {}},
+                     {"threshold": "nan", "per_class": {}},
+                     {"per_class": {"0": 50.0}},
+                     -1, "not json"):
+            self.assertEqual(self.load(data).threshold, DEFAULT_THRESHOLD, data)
+
+    def test_calibrated_thresholds(self):
+        thresholds = self.load({"threshold": 55.0, "per_class": {"0": 50.0, "1": 0.0}})
+        self.assertEqual(thresholds.threshold, 55.0)
+        self.assertEqual(thresholds.per_class, {0: 50.0})
+        self.assertTrue(thresholds.accepts(0, 49.0))
+        self.assertFalse(thresholds.accepts(0, 52.0))
+        self.assertTrue(thresholds.accepts(1, 52.0))
+        self.assertFalse(thresholds.accepts(-1, 1.0))
+
+
+class EnrollmentTests(SimpleTestCase):
+    """train.py --enroll adds only the images the model doesn't hold, and flags the .yml."""
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        os.makedirs(os.path.join(self.folder, "models"))
+        for name, value in (("MODEL_PATH", os.path.join(self.folder, "models", "face_recognizer.yml")),
+                            ("LABELS_PATH", os.path.join(self.folder, "models", "labels.json")),
+                            ("DATASET_DIR", self.folder)):
+            patcher = mock.patch.object(train, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # the images are placeholders: every one "contains" a random face
+        rng = np.random.default_rng(0)
+        patcher = mock.patch.object(train, "preprocess_paths", side_effect=lambda images, **kwargs: [
+            [rng.integers(0, 256, train.FACE_SIZE, dtype=np.uint8) for _ in paths] for paths in images])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.known = self.add_images("alice", 2)
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.train([rng.integers(0, 256, train.FACE_SIZE, dtype=np.uint8) for _ in range(2)],
+                         np.array([0, 0]))
+        train.save_model(recognizer, {0: "alice"}, {train.file_hash(path): 0 for path in self.known})
+
+    def add_images(self, person, count, start=0):
+        os.makedirs(os.path.join(self.folder, person), exist_ok=True)
+        paths = []
+        for i in range(start, start + count):
+            paths.append(os.path.join(self.folder, person, f"{i}.jpg"))
+            with open(paths[-1], "w") as f:
+                f.write(f"{person} {i}")
+        return paths
+
+    def meta(self):
+        return lbph_model.read_meta(train.binary_path(train.MODEL_PATH))
+
+    def stale(self):
+        return os.path.exists(train.MODEL_PATH + lbph_model.STALE_SUFFIX)
+
+    def test_enroll_skips_images_in_the_model(self):
+        self.add_images("alice", 1, start=2)
+        self.assertTrue(train.enroll("alice", workers=1))
+        count = self.meta()["count"]
+        self.assertGreater(count, 2)
+
+        # no face cache involved: enrolling again, or with a fresh cache, adds nothing
+        self.assertTrue(train.enroll("alice", workers=1))
+        self.assertEqual(self.meta()["count"], count)
+        self.assertEqual(len(self.meta()["images"]), 3)
+
+    def test_enroll_marks_yml_stale_until_synced(self):
+        paths = self.add_images("bob", 2)
+        self.assertFalse(self.stale())
+        self.assertTrue(train.enroll("bob", workers=1))
+        self.assertTrue(self.stale())
+        self.assertEqual(self.meta()["images"][train.file_hash(paths[0])], 1)
+        self.assertEqual(lbph_model.pending_rows(train.MODEL_PATH), self.meta()["count"] - 2)
+
+        lbph_model.sync_yml(train.MODEL_PATH)
+        self.assertFalse(self.stale())
+        self.assertEqual(lbph_model.pending_rows(train.MODEL_PATH), 0)
+
+        self.add_images("carol", 1)
+        self.assertTrue(train.enroll("carol", workers=1, sync_yml=True))
+        self.assertFalse(self.stale())
+        self.assertEqual(lbph_model.pending_rows(train.MODEL_PATH), 0)
+
+    def test_existing_person_needs_recorded_images(self):
+        # a model trained before images were recorded
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(train.MODEL_PATH)
+        train.save_model(recognizer, {0: "alice"})
+        self.assertNotIn("images", self.meta())
+        self.assertFalse(train.enroll("alice", workers=1))
+        self.assertEqual(self.meta()["count"], 2)
+
+
+class StudentEmbeddingCleanupTests(ApiTestCase):
+    """Deleted or re-coded students are removed from the embedding store, however it happens."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.section = Section.objects.create(name="A", dep_batch=cls.dep_batch)
+        cls.students = create_students([cls.section], 3)
+
+    def setUp(self):
+        super().setUp()
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = folder.name
+        vectors = normalize(np.random.default_rng(0).standard_normal((4, 8)).astype(np.float32))
+        EmbeddingStore(self.path, dim=8, index=False).add(["00000", "00001", "00002", "99999"], vectors)
+        patcher = mock.patch.object(signals, "remove_students", functools.partial(remove_students, path=self.path))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored(self):
+        store = EmbeddingStore(self.path, readonly=True)
+        return sorted(code for code in ("00000", "00001", "00002", "99999", "A0001") if code in store)
+
+    def test_cascaded_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dep_batch.delete()
+        self.assertEqual(self.stored(), ["99999"])
+
+    def test_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.get(student_code="00001").delete()
+        self.assertEqual(self.stored(), ["00000", "00002", "99999"])
+
+    def test_code_change(self):
+        student = Student.objects.get(student_code="00001")
+        with self.captureOnCommitCallbacks(execute=True):
+            student.first_name = "Renamed"
+            student.save()
+        self.assertEqual(self.stored(), ["00000", "00001", "00002", "99999"])
+        with self.captureOnCommitCallbacks(execute=True):
+            student.student_code = "A0001"
+            student.save()
+        self.assertEqual(self.stored(), ["00000", "00002", "99999"])
+
+
+class SessionFrameTests(RunningSessionTestCase):
+    """A headless session's latest annotated frame is served as JPEG."""
+
+    @mock.patch.object(attendance_session, "detect")
+    def test_latest_frame(self, detect):
+        detect.side_effect = self.fake_detect
+        session_id = self.start()
+        response = self.client.get(f"/api/sessions/{session_id}/frame/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        frame = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(frame.shape, (48, 64, 3))
+
+        self.client.post(f"/api/sessions/{session_id}/close/")
+        self.assertEqual(self.client.get(f"/api/sessions/{session_id}/frame/").status_code, 404)
+
+    @mock.patch.object(attendance_session, "detect")
+    def test_windowed_session_has_no_frames(self, detect):
+        detect.side_effect = self.fake_detect
+        session_id = self.start(headless=False)
+        self.assertEqual(detect.call_args.kwargs["on_frame"], None)
+        self.assertEqual(self.client.get(f"/api/sessions/{session_id}/frame/").status_code, 404)
@@ -4,7 +4,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     StudentViewSet, CourseViewSet, DepBatchViewSet, SectionViewSet,
     AttendanceSessionViewSet, AttendanceRecordViewSet, RegisterView, MeView, TeacherViewSet,
-    CustomTokenObtainPairView
+    CustomTokenObtainPairView, session_event_stream
 )
 from rest_framework_simplejwt.views import  TokenRefreshView
 
@@ -24,6 +24,9 @@ urlpatterns = [
     path("auth/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("auth/me/", MeView.as_view(), name="me"),
 
+    # ---------- LIVE SESSION EVENTS (server-sent events, ASGI) ----------
+    path("sessions/<int:pk>/events/", session_event_stream, name="session-events"),
+
     path("", include(router.urls)),
 ]
 
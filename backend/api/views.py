@@ -1,12 +1,28 @@
 # api/views.py
-from AI.attendance_session import start_session, stop_session
+import json
+import asyncio
+import datetime
+from threading import Thread, Lock
+import cv2
+from AI.attendance_session import (
+    start_session, stop_session, session_events, session_frames, SessionError, SessionLimitReached
+)
+from AI.log_sink import BatchWriter
+from AI.pipeline import FrameBuffer
+from AI.photo_recognition import decode_image, recognize_photos, PhotoError
+from AI.model_registry import ModelError
+from AI.face_detectors import DetectorError
 from rest_framework import viewsets, status, generics, permissions, serializers
+from rest_framework.exceptions import APIException
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError, connection, transaction
+from django.urls import reverse
 from .models import (
     User, DepBatch, Section, Student, Course,
     AttendanceSession, AttendanceRecord, AIRecognitionResult
@@ -15,6 +31,7 @@ from .serializers import (
     UserSerializer, DepBatchSerializer, SectionSerializer, StudentSerializer,
     CourseSerializer, AttendanceSessionSerializer, AttendanceRecordSerializer, RegisterSerializer
 )
+from .pagination import AttendanceCursorPagination, SessionCursorPagination
 from .permissions import IsTeacher, IsAdmin
 
 
@@ -87,7 +104,7 @@ class TeacherViewSet(viewsets.ModelViewSet):
 
 # ---------- Student ViewSet ----------
 class StudentViewSet(viewsets.ModelViewSet):
-    queryset = Student.objects.all().order_by("student_code")
+    queryset = Student.objects.select_related("section__dep_batch").order_by("student_code")
     serializer_class = StudentSerializer
 
     def get_permissions(self):
@@ -97,7 +114,7 @@ class StudentViewSet(viewsets.ModelViewSet):
 
 # ---------- Course ViewSet ----------
 class CourseViewSet(viewsets.ModelViewSet):
-    queryset = Course.objects.all().order_by("code")
+    queryset = Course.objects.select_related("teacher").order_by("code")
     serializer_class = CourseSerializer
 
     def get_permissions(self):
@@ -112,7 +129,7 @@ class DepBatchViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdmin]#permissions.AllowAny()]
 
 class SectionViewSet(viewsets.ModelViewSet):
-    queryset = Section.objects.all()
+    queryset = Section.objects.select_related("dep_batch")
     serializer_class = SectionSerializer
     
     def get_permissions(self):
@@ -120,56 +137,386 @@ class SectionViewSet(viewsets.ModelViewSet):
             return [IsAdmin()]
         return [permissions.IsAuthenticated()]
 
+# ---------- list filters ----------
+# /api/attendance/ and /api/sessions/ are paged by cursor (api/pagination.py) and filtered
+# in the database; every filter hits an index (see the models' Meta), so a page costs the
+# same however many records there are. Dates are turned into timestamp ranges instead of
+# __date lookups, which would have to convert every row.
+def query_int(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise serializers.ValidationError({name: "Expected an integer id."})
+
+
+def query_date(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise serializers.ValidationError({name: "Expected a date (YYYY-MM-DD)."})
+
+
+def day_start(day):
+    # midnight of day in the current time zone, as an aware datetime
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def filter_dates(queryset, params, field):
+    # ?date=, or the inclusive ?date_from= / ?date_to= range, on a datetime field
+    day = query_date(params, "date")
+    start = day or query_date(params, "date_from")
+    end = day or query_date(params, "date_to")
+    if start is not None:
+        queryset = queryset.filter(**{f"{field}__gte": day_start(start)})
+    if end is not None:
+        queryset = queryset.filter(**{f"{field}__lt": day_start(end + datetime.timedelta(days=1))})
+    return queryset
+
+
 # ---------- AttendanceSession ----------
+class DetectorUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "No attendance detector is available for this session."
+    default_code = "detector_unavailable"
+
+
+def camera_source(value):
+    # device index ("0", 1) or a stream URL
+    value = str(value).strip()
+    return int(value) if value.isdigit() else value
+
+
+def student_codes(value):
+    # list of codes, or a comma separated string (form data)
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(code).strip() for code in value if str(code).strip()]
+
+
+CAPTURE_MAX_BYTES = 25 * 1024 * 1024  # whole multipart body of one capture request
+FRAME_JPEG_QUALITY = 80               # GET /api/sessions/{id}/frame/
+
+
+class InMemoryUploadHandler(MemoryFileUploadHandler):
+    # capture photos are decoded straight from memory, never spooled to a temp file
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.activated = True
+
+
+def recognition_recorder(session_id):
+    """BatchWriter that stores a running session's recognitions as they happen."""
+    def flush(batch):
+        try:
+            recognized = Student.objects.filter(
+                student_code__in={event["student_code"] for event in batch}
+            ).values_list("id", flat=True)
+            AIRecognitionResult.objects.bulk_create(
+                [AIRecognitionResult(session_id=session_id, student_id=student_id) for student_id in recognized],
+                ignore_conflicts=True
+            )
+        finally:
+            connection.close()  # runs on the writer thread
+    return BatchWriter(flush, name=f"recognitions-{session_id}")
+
+
+def mark_attendance(session, recognized_codes):
+    """
+    Record the recognized students, mark the section present / absent and close the session.
+    Called after stop_session(), which has flushed the session's recorder.
+    """
+    # a constant number of queries, whatever the section size
+    with transaction.atomic():
+        recognized = Student.objects.filter(student_code__in=set(recognized_codes)).values_list("id", flat=True)
+        AIRecognitionResult.objects.bulk_create(
+            [AIRecognitionResult(session=session, student_id=student_id) for student_id in recognized],
+            ignore_conflicts=True
+        )
+        # also includes students recognized on uploaded photos (capture)
+        present = set(AIRecognitionResult.objects.filter(session=session).values_list("student_id", flat=True))
+        section_students = Student.objects.filter(section_id=session.section_id).values_list("id", flat=True)
+        # existing records (e.g. edited by the teacher) are kept as they are
+        AttendanceRecord.objects.bulk_create(
+            [
+                AttendanceRecord(session=session, student_id=student_id, status="present",
+                                 confirmation_method="ai_camera")
+                if student_id in present else
+                AttendanceRecord(session=session, student_id=student_id, status="absent",
+                                 confirmation_method="ai_absent")
+                for student_id in section_students
+            ],
+            ignore_conflicts=True
+        )
+        session.is_active = False
+        session.save(update_fields=["is_active"])
+
+
+# asynchronous closes in this process: {session id: "closing" or the error of a failed close}
+_closing = {}
+_closing_lock = Lock()
+
+
+def close_in_background(session_id):
+    try:
+        session = AttendanceSession.objects.get(pk=session_id)
+        mark_attendance(session, stop_session(session_id))
+        state = None
+    except Exception as exc:
+        state = str(exc) or exc.__class__.__name__
+    finally:
+        connection.close()  # this thread's own database connection
+    with _closing_lock:
+        if state is None:
+            _closing.pop(session_id, None)
+        else:
+            _closing[session_id] = state
+
+
 class AttendanceSessionViewSet(viewsets.ModelViewSet):
-    queryset = AttendanceSession.objects.all().order_by("-created_at")
+    # the serializers nest every related object: fetch them in the same query
+    queryset = AttendanceSession.objects.select_related(
+        "course__teacher", "created_by"
+    ).order_by("-created_at", "-id")
     serializer_class = AttendanceSessionSerializer
+    pagination_class = SessionCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != "list":
+            return queryset
+        # ?course=&section=&is_active=&date=|date_from=&date_to=
+        params = self.request.query_params
+        course = query_int(params, "course")
+        if course is not None:
+            queryset = queryset.filter(course_id=course)
+        section = query_int(params, "section")
+        if section is not None:
+            queryset = queryset.filter(section_id=section)
+        is_active = params.get("is_active")
+        if is_active not in (None, ""):
+            queryset = queryset.filter(is_active=is_active.lower() in ("1", "true", "yes"))
+        return filter_dates(queryset, params, "created_at")
 
     def get_permissions(self):
-        if self.action in ["create", "close"]:
+        if self.action in ["create", "close", "capture"]:
             return [permissions.AllowAny()]#IsTeacher()]#permissions.AllowAny()]
         return [permissions.AllowAny()]#permissions.IsAuthenticated()]#permissions.AllowAny()]
     
     def perform_create(self, serializer):
             # set created_by from request (teacher)
-            serializer.save(created_by=self.request.user)
-            start_session()
+            session = serializer.save(created_by=self.request.user)
+            # "headless": true runs the detector without an OpenCV window (servers / Docker)
+            headless = str(self.request.data.get("headless", "false")).lower() in ("1", "true", "yes")
+            # "camera_source": device index or stream URL of the classroom camera
+            source = camera_source(self.request.data.get("camera_source", 0))
+            # only match faces against this section's students, plus an optional
+            # "allow_students" list (e.g. students attending as guests)
+            students = list(session.section.students.values_list("student_code", flat=True))
+            students += student_codes(self.request.data.get("allow_students"))
+            # recognitions are stored while the session runs, see also session_event_stream
+            recorder = recognition_recorder(session.id)
+            # without a window, the latest annotated frame is served by the frame action
+            frames = FrameBuffer() if headless else None
+            try:
+                start_session(session.id, source=source, headless=headless, on_frame=frames, students=students,
+                              recorder=recorder)
+            except SessionLimitReached as exc:
+                recorder.close()
+                session.delete()
+                raise DetectorUnavailable(str(exc))
+            except SessionError as exc:
+                recorder.close()
+                session.delete()
+                raise serializers.ValidationError({"detail": str(exc)})
 
 
     @action(detail=True, methods=["post"])
     def close(self, request, pk=None):
+        """
+        Stop the session's detector and mark attendance. With "async": true (body or query
+        string) this returns 202 and a status URL right away and closes in the background.
+        """
         session = self.get_object()
         if request.user.role != "teacher" and session.created_by != request.user:
             return Response({"detail": "Forbidden"}, status=403)
-        # write sosis closing logic here
-        result = stop_session()
-        # print(result)
-        for student in result:
-            # print(student)
-            recognized_student = Student.objects.filter(student_code=student).first()
-            if recognized_student:
-                AIRecognitionResult.objects.get_or_create(session=session, student=recognized_student, timestamp=timezone.now())
-        # print(session.section)
-        students = Student.objects.filter(section=session.section) 
-        # print(students)
-        ai_students = Student.objects.filter(
-                            airecognitionresult__session=session
-                        ).distinct()
-        for student in students:
-            # print("this run")
-            if student in ai_students:
-                AttendanceRecord.objects.get_or_create(session=session, student=student, status="present", timestamp=timezone.now(), confirmation_method="ai_camera")
-                # print(AttendanceRecord.objects.get(session=session, student=student))
-            else:
-                AttendanceRecord.objects.get_or_create(session=session, student=student, status="absent", timestamp=timezone.now(), confirmation_method="ai_absent")
-        session.is_active = False
-        session.save(update_fields=["is_active"])
+
+        run_async = request.data.get("async", request.query_params.get("async", "false"))
+        if str(run_async).lower() in ("1", "true", "yes"):
+            with _closing_lock:
+                if _closing.get(session.id) != "closing":
+                    _closing[session.id] = "closing"
+                    Thread(target=close_in_background, args=(session.id,), name=f"close-{session.id}",
+                           daemon=True).start()
+            status_url = request.build_absolute_uri(reverse("sessions-close-status", kwargs={"pk": session.id}))
+            return Response({"status": "closing", "status_url": status_url}, status=status.HTTP_202_ACCEPTED)
+
+        mark_attendance(session, stop_session(session.id))
         return Response({"message": "Session closed ans attendance has been marked and absentees marked"})
 
+    @action(detail=True, methods=["get"], url_path="close-status")
+    def close_status(self, request, pk=None):
+        """Progress of an asynchronous close: "closing", "failed", "closed" or "active"."""
+        session = self.get_object()
+        with _closing_lock:
+            state = _closing.get(session.id)
+        if state == "closing":
+            return Response({"status": "closing"})
+        if state is not None:
+            return Response({"status": "failed", "detail": state})
+        if session.is_active:
+            return Response({"status": "active"})
+        records = AttendanceRecord.objects.filter(session=session)
+        return Response({
+            "status": "closed",
+            "present": records.filter(status="present").count(),
+            "absent": records.filter(status="absent").count(),
+        })
+
+    @action(detail=True, methods=["get"])
+    def frame(self, request, pk=None):
+        """Latest annotated camera frame (JPEG) of a headless session running in this process."""
+        session = self.get_object()
+        frames = session_frames(session.id)
+        frame = frames.latest() if isinstance(frames, FrameBuffer) else None
+        if frame is None:
+            return Response({"detail": "No camera frame available for this session."}, status=404)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, FRAME_JPEG_QUALITY])
+        if not ok:
+            return Response({"detail": "Could not encode the camera frame."}, status=500)
+        response = HttpResponse(jpeg.tobytes(), content_type="image/jpeg")
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    @action(detail=True, methods=["post"], parser_classes=[MultiPartParser, FormParser])
+    def capture(self, request, pk=None):
+        """
+        Recognize uploaded classroom photos ("image", repeatable, or "images") against the
+        session's section; recognized students are recorded like the live detector's.
+        """
+        session = self.get_object()
+        if not session.is_active:
+            return Response({"success": False, "error": "Session is closed"}, status=400)
+        if int(request.META.get("CONTENT_LENGTH") or 0) > CAPTURE_MAX_BYTES:
+            return Response({"success": False, "error": "Upload too large"}, status=413)
+
+        request.upload_handlers = [InMemoryUploadHandler(request._request)]
+        uploads = request.FILES.getlist("image") + request.FILES.getlist("images")
+        if not uploads:
+            return Response({"success": False, "error": "No image uploaded"}, status=400)
+        try:
+            images = [decode_image(upload.read()) for upload in uploads]
+        except PhotoError as exc:
+            return Response({"success": False, "error": str(exc)}, status=400)
+
+        students = list(session.section.students.values_list("student_code", flat=True))
+        students += student_codes(request.data.get("allow_students"))
+        try:
+            result = recognize_photos(images, students=students)
+        except (ModelError, DetectorError) as exc:
+            raise DetectorUnavailable(str(exc))
+
+        recognized = Student.objects.filter(
+            student_code__in=[m["student_code"] for m in result["matches"]]
+        ).values_list("id", flat=True)
+        AIRecognitionResult.objects.bulk_create(
+            [AIRecognitionResult(session=session, student_id=student_id) for student_id in recognized],
+            ignore_conflicts=True
+        )
+
+        if not result["faces"]:
+            return Response({"success": False, "error": "No faces detected in image",
+                             "processing_time": f"{result['seconds']:.2f}s"})
+        response = {
+            "success": True,
+            "total_faces_detected": result["faces"],
+            "students_identified": len(result["matches"]),
+            "unidentified_faces": len(result["unidentified"]),
+            "matches": [
+                {"student_id": m["student_code"], "name": m["name"], "confidence": m["confidence"],
+                 "face_box": m["face_box"], "image": m["image"]}
+                for m in result["matches"]
+            ],
+            "unidentified_coordinates": [face["face_box"] for face in result["unidentified"]],
+            "processing_time": f"{result['seconds']:.2f}s",
+        }
+        if result["unidentified"]:
+            response["warning"] = "Some faces could not be identified"
+        return Response(response)
+
+SSE_KEEPALIVE = 15  # seconds between keep-alive comments on an idle event stream
+
+
+async def session_event_stream(request, pk):
+    """
+    GET /api/sessions/{id}/events/: server-sent events of a running session, one
+    "recognized" event per newly recognized student and a final "closed" event. A client
+    reconnecting with Last-Event-ID (or ?since=) gets the events it missed. Served by the
+    ASGI server (uvicorn CAV.asgi:application); runserver's WSGI would hold the stream
+    back until the session ends.
+    """
+    events = session_events(pk)
+    if events is None:
+        return JsonResponse({"detail": "No running detector for this session."}, status=404)
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.GET.get("since") or 0)
+    except ValueError:
+        last_id = 0
+
+    async def stream():
+        nonlocal last_id
+        while True:
+            # blocking wait on a worker thread, the event loop stays free
+            batch = await asyncio.to_thread(events.since, last_id, SSE_KEEPALIVE)
+            if not batch:
+                yield ": keep-alive\n\n"
+                continue
+            for event in batch:
+                last_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event["type"] == "closed":
+                    return
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # no proxy buffering (nginx)
+    return response
+
+
 # ---------- AttendanceRecord viewset ----------
 class AttendanceRecordViewSet(viewsets.ModelViewSet):
-    queryset = AttendanceRecord.objects.all().order_by("-timestamp")
+    queryset = AttendanceRecord.objects.select_related(
+        "session__course__teacher", "session__created_by", "student__section__dep_batch"
+    ).order_by("-timestamp", "-id")
     serializer_class = AttendanceRecordSerializer
+    pagination_class = AttendanceCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != "list":
+            return queryset
+        # ?course=&section=&session=&student=|student_code=&status=&date=|date_from=&date_to=
+        params = self.request.query_params
+        for name, field in (("course", "session__course_id"), ("section", "session__section_id"),
+                            ("session", "session_id"), ("student", "student_id")):
+            value = query_int(params, name)
+            if value is not None:
+                queryset = queryset.filter(**{field: value})
+        code = params.get("student_code")
+        if code:
+            queryset = queryset.filter(student__student_code=code)
+        record_status = params.get("status")
+        if record_status:
+            if record_status not in dict(AttendanceRecord.STATUS_CHOICES):
+                raise serializers.ValidationError({"status": f"Unknown status: {record_status}."})
+            queryset = queryset.filter(status=record_status)
+        return filter_dates(queryset, params, "timestamp")
 
     def get_permissions(self):
         if self.action in ["update", "partial_update"]: